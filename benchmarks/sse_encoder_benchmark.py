@@ -0,0 +1,55 @@
+"""
+SSE event encoder micro-benchmark.
+
+Compares the previous encoder (json.dumps through asyncio.to_thread per token)
+with the inline orjson encoder used by LLMStreamHelper.
+
+    python -m benchmarks.sse_encoder_benchmark --events 200000 --streams 50
+"""
+import argparse, asyncio, json, os, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helper.llmStreamHelper import LLMStreamHelper
+
+TOKENS = ["你好", "，", "這是", "一段", "串流", "回應", " hello", " world", "。", "\n"]
+
+async def legacy_generate_event_data(content: str) -> str:
+    data = await asyncio.to_thread(json.dumps, {"content": content})
+    return f"data: {data}\n\n"
+
+async def fast_generate_event_data(content: str) -> bytes:
+    return LLMStreamHelper.generate_event_data(content)
+
+async def run_stream(encoder, events: int):
+    size = 0
+    for index in range(events):
+        chunk = await encoder(TOKENS[index % len(TOKENS)])
+        size += len(chunk)
+    return size
+
+async def measure(encoder, events: int, streams: int) -> float:
+    per_stream = events // streams
+    start_wall = time.perf_counter()
+    start_cpu = time.process_time()
+    await asyncio.gather(*(run_stream(encoder, per_stream) for _ in range(streams)))
+    wall = time.perf_counter() - start_wall
+    cpu = time.process_time() - start_cpu
+    total = per_stream * streams
+    print(f"  wall {wall:.3f}s, cpu {cpu:.3f}s, {total / wall:,.0f} events/s, {total / cpu:,.0f} events/cpu-s")
+    return total / cpu
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE event encoder micro-benchmark")
+    parser.add_argument("--events", type=int, default=200000, help="total events across all streams")
+    parser.add_argument("--streams", type=int, default=50, help="concurrent streams")
+    args = parser.parse_args()
+
+    print(f"legacy (json.dumps via asyncio.to_thread), {args.streams} streams")
+    legacy = asyncio.run(measure(legacy_generate_event_data, args.events, args.streams))
+    print(f"fast (inline orjson, precomputed prefix/suffix), {args.streams} streams")
+    fast = asyncio.run(measure(fast_generate_event_data, args.events, args.streams))
+    print(f"speedup per cpu-second: {fast / legacy:.1f}x")
+
+if __name__ == "__main__":
+    main()
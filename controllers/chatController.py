@@ -2,19 +2,26 @@ from services.chatService import ChatService
 from services.dependencies import get_chat_service
 
 from core.auth import get_current_user
-from models.request.chatRequest import ChatRequest, SummaryRequest
+from models.request.chatRequest import ChatHistoryQuery, ChatRequest, SummaryRequest
+from typing import List, Literal, Optional
 
-from fastapi import APIRouter, HTTPException, Depends, Security
+from fastapi import APIRouter, HTTPException, Depends, Query, Security
 
 router = APIRouter(prefix="/Chat", tags=["Chat Management"])
 @router.get("/getChatHistoryBySessionId/{chat_session_id}")
 async def get_chat_history_by_session_id(
     chat_session_id: int,
+    before: Optional[int] = Query(default=None, ge=0, description="return messages with seq lower than this"),
+    after: Optional[int] = Query(default=None, ge=0, description="return messages with seq higher than this"),
+    limit: Optional[int] = Query(default=None, ge=1, le=500),
+    include_system: bool = True,
+    fields: Optional[List[Literal["role", "content", "timestamp"]]] = Query(default=None),
     service: ChatService = Depends(get_chat_service),
     user_payload: dict = Security(get_current_user, scopes=["authenticated"]) 
 ):
     """ get chat histoty by session_id from mongodb """
-    result = await service.get_chat_history_by_session_id(chat_session_id)
+    query = ChatHistoryQuery(before=before, after=after, limit=limit, include_system=include_system, fields=fields)
+    result = await service.get_chat_history_by_session_id(chat_session_id, query)
     if (result.code == 200):
         return result
     else:
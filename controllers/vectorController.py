@@ -1,13 +1,15 @@
 from services.vectorService import VectorService
 from services.dependencies import get_vector_service
-from fastapi import APIRouter, HTTPException, Depends, Security
+from fastapi import APIRouter, HTTPException, Depends, Request, Security
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
 
-from models.request.vectorRequest import CheckVectorDataExistRequest, DeleteVectorDataRequest, GenerateCollectionRequest, VectorSearchRequest, UpsertCollectionRequest
+from models.request.vectorRequest import BatchVectorDataRequest, CheckVectorDataExistRequest, DeleteVectorDataRequest, EnsurePayloadIndexRequest, GenerateCollectionRequest, IngestArticleRequest, MigratePointIdsRequest, VectorSearchRequest, UpsertCollectionRequest
 from core.auth import get_current_user
 from models.dto.resultdto import ResultDTO
-from models.response.vectorResponse import CollectionInfo, VectorSearchResult
+from models.response.vectorResponse import BatchVectorDataResult, CollectionInfo, VectorSearchResult
 
-from typing import List
+from typing import Dict, List
 
 router = APIRouter(prefix="/Vector", tags=["Vector Management"])
 
@@ -23,6 +25,14 @@ async def get_collections(
     else:
         raise HTTPException(status_code=result.code, detail=result.message)
     
+@router.get("/embedding_metrics", response_model=ResultDTO[dict])
+async def get_embedding_metrics(
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]) 
+) -> ResultDTO[dict]:
+    """Get query embedding batcher metrics"""
+    return service.get_embedding_metrics()
+    
 @router.post("/check_vector_data_exist", response_model=ResultDTO[bool])
 async def check_vector_data_exist(
     request: CheckVectorDataExistRequest, 
@@ -49,6 +59,24 @@ async def delete_vector_data(
     else:
         raise HTTPException(status_code=result.code, detail=result.message)
 
+@router.post("/batch_check_vector_data_exist", response_model=ResultDTO[List[BatchVectorDataResult]])
+async def batch_check_vector_data_exist(
+    request: BatchVectorDataRequest, 
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]),
+) -> ResultDTO[List[BatchVectorDataResult]]:
+    """check vector data exist for many ids, grouped per collection"""
+    return await service.batch_check_vector_data_exist(request)
+    
+@router.delete("/batch_delete_vector_data", response_model=ResultDTO[List[BatchVectorDataResult]])
+async def batch_delete_vector_data(
+    request: BatchVectorDataRequest, 
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]),
+) -> ResultDTO[List[BatchVectorDataResult]]:
+    """delete vector data for many ids, grouped per collection"""
+    return await service.batch_delete_vector_data(request)
+
 @router.post("/collections/search", response_model=ResultDTO[List[VectorSearchResult]])
 async def vector_semantic_search(
     request: VectorSearchRequest, 
@@ -77,6 +105,40 @@ async def upsert_texts(
     else:
         raise HTTPException(status_code=result.code, detail=result.message)
 
+@router.post("/collections/ingest_article")
+async def ingest_article(
+    request: IngestArticleRequest,
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]) 
+) -> ResultDTO:
+    """Chunk raw article text server-side and upsert the chunks"""
+    result = await service.ingest_article(request)
+    
+    if result.code == 200:
+        return result
+    else:
+        raise HTTPException(status_code=result.code, detail=result.message)
+
+@router.post("/collections/bulk_upsert")
+async def bulk_upsert_texts(
+    request: Request,
+    collection_name: str,
+    id: int,
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]) 
+) -> StreamingResponse:
+    """Upload NDJSON text points ({"text": ...} per line) into a collection, streaming progress per batch"""
+    if error := await service.check_collection_exists(collection_name):
+        raise HTTPException(status_code=error.code, detail=error.message)
+    
+    # read the whole upload before streaming progress back
+    spool = await service.bulk_upsert_helper.spool_body(request.stream())
+    return StreamingResponse(
+        service.bulk_upsert_texts(collection_name, id, service.bulk_upsert_helper.iter_spooled(spool)),
+        media_type="application/x-ndjson",
+        background=BackgroundTask(spool.close)
+    )
+
 @router.post("/generate_collections")
 async def generate_collection(
     request: GenerateCollectionRequest,
@@ -86,6 +148,34 @@ async def generate_collection(
     """Generate a new collection"""
     result = await service.generate_collection(request)
     
+    if result.code == 200:
+        return result
+    else:
+        raise HTTPException(status_code=result.code, detail=result.message)
+
+@router.post("/collections/ensure_indexes", response_model=ResultDTO[Dict[str, List[str]]])
+async def ensure_payload_indexes(
+    request: EnsurePayloadIndexRequest,
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]) 
+) -> ResultDTO[Dict[str, List[str]]]:
+    """Backfill payload indexes on one or all existing collections"""
+    result = await service.backfill_payload_indexes(request)
+    
+    if result.code == 200:
+        return result
+    else:
+        raise HTTPException(status_code=result.code, detail=result.message)
+
+@router.post("/collections/migrate_point_ids", response_model=ResultDTO[dict])
+async def migrate_point_ids(
+    request: MigratePointIdsRequest,
+    service: VectorService = Depends(get_vector_service),
+    user_payload: dict = Security(get_current_user, scopes=["authenticated"]) 
+) -> ResultDTO[dict]:
+    """Rewrite legacy integer point ids in a collection to collision-free UUIDs"""
+    result = await service.migrate_point_ids(request)
+    
     if result.code == 200:
         return result
     else:
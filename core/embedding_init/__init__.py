@@ -1,9 +1,29 @@
-from sentence_transformers import SentenceTransformer
 from core.qdrant_client_init import qdrant_client
-import os
+import os, threading
 class Embedding:
     def __init__(self):
         self.client = qdrant_client.client
-        self.model = SentenceTransformer(os.getenv("MODEL_NAME"))
+        self.mode = os.getenv("EMBEDDING_MODE", "local")
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        """ load the model on first use so processes that never embed (e.g. the standalone consumer) skip it """
+        if self._model is None:
+            with self._lock:
+                if self._model is None:
+                    self._model = self.load_model()
+        return self._model
+
+    def load_model(self):
+        if self.mode == "server":
+            from core.embedding_init.server import EmbeddingServerClient
+            return EmbeddingServerClient(os.getenv("EMBEDDING_SOCKET_PATH"))
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(os.getenv("MODEL_NAME"))
+
+    def encode(self, *args, **kwargs):
+        return self.model.encode(*args, **kwargs)
         
 embedding = Embedding()
\ No newline at end of file
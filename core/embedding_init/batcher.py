@@ -0,0 +1,95 @@
+import asyncio, os, time
+from typing import List, Optional
+from concurrent.futures import Executor
+
+class EmbeddingBatcher:
+    """合併併發的查詢編碼請求為單次批次 encode"""
+
+    def __init__(self, model, executor: Executor, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self.model = model
+        self.executor = executor
+        self.max_batch_size = max_batch_size or int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "32"))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5"))) / 1000
+        self.queue: Optional[asyncio.Queue] = None
+        self.worker_task: Optional[asyncio.Task] = None
+
+        self.total_requests = 0
+        self.total_batches = 0
+        self.max_observed_batch = 0
+        self.last_batch_size = 0
+
+    def start(self):
+        if self.worker_task and not self.worker_task.done():
+            return
+        self.queue = asyncio.Queue()
+        self.worker_task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self.worker_task and not self.worker_task.done():
+            self.worker_task.cancel()
+            try:
+                await self.worker_task
+            except asyncio.CancelledError:
+                pass
+        self.worker_task = None
+
+    async def encode(self, text: str) -> List[float]:
+        self.start()
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((text, future))
+        self.total_requests += 1
+        return await future
+
+    async def _collect_batch(self) -> list:
+        batch = [await self.queue.get()]
+        deadline = time.monotonic() + self.max_wait
+
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            batch = [(text, future) for text, future in batch if not future.cancelled()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            try:
+                vectors = await loop.run_in_executor(
+                    self.executor,
+                    lambda: self.model.encode(texts, batch_size=len(texts)).tolist()
+                )
+            except Exception as e:
+                print(f"批次編碼失敗: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            self.total_batches += 1
+            self.last_batch_size = len(batch)
+            self.max_observed_batch = max(self.max_observed_batch, len(batch))
+
+            for (_, future), vector in zip(batch, vectors):
+                if not future.done():
+                    future.set_result(vector)
+
+    def metrics(self) -> dict:
+        return {
+            "queue_depth": self.queue.qsize() if self.queue else 0,
+            "total_requests": self.total_requests,
+            "total_batches": self.total_batches,
+            "avg_batch_size": self.total_requests / self.total_batches if self.total_batches else 0.0,
+            "last_batch_size": self.last_batch_size,
+            "max_batch_size": self.max_observed_batch,
+        }
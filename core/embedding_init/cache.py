@@ -0,0 +1,71 @@
+import os, time, hashlib
+import numpy as np
+from collections import OrderedDict
+from typing import List, Optional
+
+class EmbeddingCache:
+    """查詢向量 LRU + TTL 快取，以 float32 陣列儲存"""
+
+    def __init__(self, model_name: Optional[str] = None, max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None):
+        self.model_name = model_name or os.getenv("MODEL_NAME", "")
+        self.max_entries = max_entries or int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", "10000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("EMBEDDING_CACHE_TTL_SECONDS", "3600"))
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def make_key(self, text: str) -> str:
+        raw = f"{self.model_name}\x00{self.normalize(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.make_key(text)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        vector, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return vector.tolist()
+
+    def put(self, text: str, vector: List[float]):
+        key = self.make_key(text)
+        self._entries[key] = (
+            np.asarray(vector, dtype=np.float32),
+            time.monotonic() + self.ttl_seconds
+        )
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,239 @@
+import os, asyncio, socket, struct, threading
+import numpy as np
+from typing import List, Optional, Union
+
+# 協議 (little-endian):
+#   請求: uint32 文本數量, 每個文本為 uint32 長度 + utf-8 位元組
+#   回應: uint8 狀態 (0 成功 / 1 失敗)
+#         成功: uint32 向量數量, uint32 維度, float32 向量資料
+#         失敗: uint32 長度 + utf-8 錯誤訊息
+STATUS_OK = 0
+STATUS_ERROR = 1
+UINT32 = struct.Struct("<I")
+RESPONSE_HEADER = struct.Struct("<BII")
+
+def get_socket_path() -> str:
+    return os.getenv("EMBEDDING_SOCKET_PATH", "/tmp/embedding.sock")
+
+def encode_request(texts: List[str]) -> bytes:
+    parts = [UINT32.pack(len(texts))]
+    for text in texts:
+        data = text.encode("utf-8")
+        parts.append(UINT32.pack(len(data)))
+        parts.append(data)
+    return b"".join(parts)
+
+def encode_response(vectors: np.ndarray) -> bytes:
+    vectors = np.ascontiguousarray(vectors, dtype="<f4")
+    if vectors.size == 0:
+        return RESPONSE_HEADER.pack(STATUS_OK, 0, 0)
+    count, dim = vectors.shape
+    return RESPONSE_HEADER.pack(STATUS_OK, count, dim) + vectors.tobytes()
+
+def encode_error(message: str) -> bytes:
+    data = message.encode("utf-8")
+    return bytes([STATUS_ERROR]) + UINT32.pack(len(data)) + data
+
+class EmbeddingServerClient:
+    """與 SentenceTransformer.encode 介面相容的嵌入服務客戶端"""
+
+    def __init__(self, socket_path: Optional[str] = None, timeout: float = 30.0):
+        self.socket_path = socket_path or get_socket_path()
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _get_socket(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = self._connect()
+            self._local.sock = sock
+        return sock
+
+    def _reset_socket(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+
+    @staticmethod
+    def _recv_exact(sock: socket.socket, size: int) -> bytes:
+        buffer = bytearray(size)
+        view = memoryview(buffer)
+        received = 0
+        while received < size:
+            n = sock.recv_into(view[received:], size - received)
+            if n == 0:
+                raise ConnectionError("Embedding server closed the connection")
+            received += n
+        return bytes(buffer)
+
+    def _request(self, texts: List[str]) -> np.ndarray:
+        sock = self._get_socket()
+        try:
+            sock.sendall(encode_request(texts))
+            status = self._recv_exact(sock, 1)[0]
+            if status != STATUS_OK:
+                (length,) = UINT32.unpack(self._recv_exact(sock, UINT32.size))
+                message = self._recv_exact(sock, length).decode("utf-8")
+                raise RuntimeError(f"Embedding server error: {message}")
+
+            count, dim = struct.unpack("<II", self._recv_exact(sock, 8))
+            data = self._recv_exact(sock, count * dim * 4)
+        except (ConnectionError, OSError):
+            self._reset_socket()
+            raise
+        return np.frombuffer(data, dtype="<f4").reshape(count, dim)
+
+    def encode(self, sentences: Union[str, List[str]], **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        if not texts:
+            return np.empty((0, 0), dtype="<f4")
+
+        try:
+            vectors = self._request(texts)
+        except (ConnectionError, OSError):
+            vectors = self._request(texts)
+
+        return vectors[0] if single else vectors
+
+class EmbeddingServer:
+    """在單一進程持有模型，為多個 worker 合併批次編碼"""
+
+    def __init__(self, model, socket_path: Optional[str] = None, max_batch_size: Optional[int] = None, max_wait_ms: Optional[float] = None):
+        self.model = model
+        self.socket_path = socket_path or get_socket_path()
+        self.max_batch_size = max_batch_size or int(os.getenv("EMBEDDING_SERVER_MAX_BATCH_SIZE", "64"))
+        self.max_wait = (max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBEDDING_SERVER_MAX_WAIT_MS", "5"))) / 1000
+        self.queue: Optional[asyncio.Queue] = None
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    (count,) = UINT32.unpack(await reader.readexactly(UINT32.size))
+                except asyncio.IncompleteReadError:
+                    break
+
+                texts = []
+                for _ in range(count):
+                    (length,) = UINT32.unpack(await reader.readexactly(UINT32.size))
+                    texts.append((await reader.readexactly(length)).decode("utf-8"))
+
+                if not texts:
+                    writer.write(encode_response(np.empty((0, 0), dtype="<f4")))
+                    await writer.drain()
+                    continue
+
+                future = loop.create_future()
+                await self.queue.put((texts, future))
+                try:
+                    writer.write(encode_response(await future))
+                except Exception as e:
+                    writer.write(encode_error(str(e)))
+                await writer.drain()
+        except Exception as e:
+            print(f"Embedding connection error: {str(e)}")
+        finally:
+            writer.close()
+
+    async def _collect_batch(self) -> list:
+        batch = [await self.queue.get()]
+        size = len(batch[0][0])
+        deadline = asyncio.get_running_loop().time() + self.max_wait
+
+        while size < self.max_batch_size:
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                break
+            try:
+                item = await asyncio.wait_for(self.queue.get(), timeout=remaining)
+            except asyncio.TimeoutError:
+                break
+            batch.append(item)
+            size += len(item[0])
+
+        return batch
+
+    async def _encode(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.get_running_loop().run_in_executor(
+            None,
+            lambda: self.model.encode(texts, batch_size=len(texts), convert_to_numpy=True)
+        )
+
+    async def _encode_each(self, batch: list):
+        """合併批次失敗時逐一重試，只讓出錯的請求失敗"""
+        for item_texts, future in batch:
+            try:
+                vectors = await self._encode(item_texts)
+            except Exception as e:
+                if not future.done():
+                    future.set_exception(e)
+                continue
+            if not future.done():
+                future.set_result(vectors)
+
+    async def run_batches(self):
+        while True:
+            batch = await self._collect_batch()
+            texts = [text for item_texts, _ in batch for text in item_texts]
+
+            try:
+                vectors = await self._encode(texts)
+            except Exception as e:
+                print(f"Embedding batch failed: {str(e)}")
+                if len(batch) > 1:
+                    await self._encode_each(batch)
+                else:
+                    _, future = batch[0]
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            start = 0
+            for item_texts, future in batch:
+                end = start + len(item_texts)
+                if not future.done():
+                    future.set_result(vectors[start:end])
+                start = end
+
+    async def serve(self):
+        if os.path.exists(self.socket_path):
+            os.unlink(self.socket_path)
+
+        self.queue = asyncio.Queue()
+        batch_task = asyncio.create_task(self.run_batches())
+        server = await asyncio.start_unix_server(self.handle_connection, path=self.socket_path)
+        print(f"Embedding server listening on {self.socket_path}")
+
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batch_task.cancel()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+async def main():
+    from dotenv import load_dotenv
+    from sentence_transformers import SentenceTransformer
+
+    load_dotenv()
+    if threads := os.getenv("EMBEDDING_SERVER_THREADS"):
+        import torch
+        torch.set_num_threads(int(threads))
+
+    await EmbeddingServer(SentenceTransformer(os.getenv("MODEL_NAME"))).serve()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -73,6 +73,35 @@ class PromptTemplates:
          ⚠ 禁止出現個人觀點或評論
       """)
       
+   def conversation_summarizer(self, previous_summary: Optional[str] = None) -> str:
+      """長對話滾動摘要模板"""
+      summary = previous_summary or "（尚無摘要）"
+      return dedent(f"""\
+      你是一個專業的對話摘要專家，負責壓縮較早的對話內容，嚴格按照以下要求：
+      
+      【既有摘要】
+      {summary}
+      
+      1. 核心要求：
+         - 使用繁體中文
+         - 將既有摘要與新的對話內容整合為一份完整摘要
+         - 保留使用者的目標、偏好、已確認的事實與未解決的問題
+         - 保留關鍵名詞、數字與結論
+      2. 格式規範：
+         ✓ 使用項目符號（•）列舉要點
+         ✓ 篇幅精簡，不超過 300 字
+      3. 嚴格禁止：
+         ⚠ 不得添加對話中未提及的內容
+         ⚠ 禁止回答對話中的問題，只做摘要
+      """)
+
+   def conversation_summary_context(self, summary: str) -> str:
+      """注入先前對話摘要的系統訊息"""
+      return dedent(f"""\
+      以下是本次對話較早內容的摘要，請作為背景參考：
+      {summary}
+      """)
+      
    def article_writer(self) -> str:
       """英文文章寫手"""
       return dedent("""\
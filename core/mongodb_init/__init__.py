@@ -1,32 +1,120 @@
 from motor.motor_asyncio import AsyncIOMotorClient
-from pymongo import MongoClient 
+from pymongo import MongoClient, ASCENDING
+from pymongo.errors import DuplicateKeyError, OperationFailure
 from fastapi import FastAPI
+from typing import Optional
 import os
 
+# IndexOptionsConflict / IndexKeySpecsConflict
+INDEX_CONFLICT_CODES = {85, 86}
+INDEX_NOT_FOUND_CODE = 27
+
 class MongoDB:
     def __init__(self):
         self.async_client = None
         self.db = None
+        self.MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", "100"))
+        self.MIN_POOL_SIZE = int(os.getenv("MONGODB_MIN_POOL_SIZE", "10"))
+        self.WAIT_QUEUE_TIMEOUT_MS = int(os.getenv("MONGODB_WAIT_QUEUE_TIMEOUT_MS", "5000"))
+        self.SERVER_SELECTION_TIMEOUT_MS = int(os.getenv("MONGODB_SERVER_SELECTION_TIMEOUT_MS", "5000"))
+        self.HISTORY_TTL_DAYS = float(os.getenv("MONGODB_HISTORY_TTL_DAYS", "0"))
+        self.HISTORY_STORAGE = os.getenv("CHAT_HISTORY_STORAGE", "embedded")
 
-    async def connect(self, app: FastAPI):
+    async def connect(self, app: Optional[FastAPI] = None):
         """ MongoDB connecting"""
         uri = f'mongodb://{os.getenv("MONGODB_USER")}:{os.getenv("MONGODB_PASSWORD")}@{os.getenv("MONGODB_HOST")}:{os.getenv("MONGODB_PORT")}/{os.getenv("MONGODB_Permission")}'
         db_name = os.getenv("MONGODB_DATABASE")
-        
+
         try:
-            self.async_client = AsyncIOMotorClient(uri)
+            self.async_client = AsyncIOMotorClient(
+                uri,
+                maxPoolSize=self.MAX_POOL_SIZE,
+                minPoolSize=self.MIN_POOL_SIZE,
+                waitQueueTimeoutMS=self.WAIT_QUEUE_TIMEOUT_MS,
+                serverSelectionTimeoutMS=self.SERVER_SELECTION_TIMEOUT_MS
+            )
             self.db = self.async_client[db_name]
-            
-            app.mongodb = self  
+            # warm-up: open the first pooled connection before serving requests
+            await self.async_client.admin.command("ping")
+
+            if app is not None:
+                app.mongodb = self
             print("MongoDB connected")
         except Exception as e:
             print(f"MongoDB connect fail: {e}")
             raise
 
+    @staticmethod
+    def _index_matches(existing: dict, keys, options: dict) -> bool:
+        if [tuple(key) for key in existing.get("key", [])] != [tuple(key) for key in keys]:
+            return False
+        return existing.get("expireAfterSeconds") == options.get("expireAfterSeconds") \
+            and bool(existing.get("unique")) == bool(options.get("unique"))
+
+    async def _create_index(self, collection, keys, name: str, **options):
+        """ create index, recreating it only when an index with the same name has a different spec """
+        existing = (await collection.index_information()).get(name)
+        if existing and self._index_matches(existing, keys, options):
+            return
+        try:
+            await collection.create_index(keys, name=name, **options)
+        except OperationFailure as e:
+            if e.code not in INDEX_CONFLICT_CODES:
+                raise
+            print(f"Index {name} options changed, recreating")
+            await self._drop_index(collection, name)
+            await collection.create_index(keys, name=name, **options)
+
+    async def _drop_index(self, collection, name: str):
+        """ drop index, treating an index already dropped by another worker as success """
+        try:
+            await collection.drop_index(name)
+        except OperationFailure as e:
+            if e.code != INDEX_NOT_FOUND_CODE:
+                raise
+
+    async def _has_duplicate_session_ids(self) -> bool:
+        cursor = self.db.histories.aggregate([
+            {"$group": {"_id": "$chat_session_id", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+            {"$limit": 1}
+        ], allowDiskUse=True)
+        return bool(await cursor.to_list(length=1))
+
+    async def ensure_indexes(self):
+        """ create indexes required by chat history storage """
+        # a non-unique fallback index is only rebuilt as unique once the duplicates are gone
+        existing = (await self.db.histories.index_information()).get("chat_session_id")
+        if existing and not existing.get("unique") and await self._has_duplicate_session_ids():
+            print("Duplicate chat_session_id found, keeping non-unique index")
+        else:
+            try:
+                await self._create_index(self.db.histories, [("chat_session_id", ASCENDING)], name="chat_session_id", unique=True)
+            except DuplicateKeyError as e:
+                print(f"Duplicate chat_session_id found, keeping non-unique index: {e}")
+                await self._create_index(self.db.histories, [("chat_session_id", ASCENDING)], name="chat_session_id")
+
+        await self._create_index(self.db.histories, [("user_id", ASCENDING)], name="user_id")
+        await self._create_index(
+            self.db.history_messages,
+            [("chat_session_id", ASCENDING), ("seq", ASCENDING)],
+            name="chat_session_id_seq",
+            unique=True
+        )
+
+        await self._create_index(self.db.histories_archive, [("chat_session_id", ASCENDING)], name="chat_session_id", unique=True)
+
+        # last_activity serves both the archival scan and the optional TTL expiry
+        # a TTL index would leave history_messages rows behind, so collection mode expires sessions in HistoryArchiveHelper
+        ttl_enabled = self.HISTORY_TTL_DAYS > 0 and self.HISTORY_STORAGE != "collection"
+        ttl_options = {"expireAfterSeconds": int(self.HISTORY_TTL_DAYS * 86400)} if ttl_enabled else {}
+        await self._create_index(self.db.histories, [("last_activity", ASCENDING)], name="last_activity", **ttl_options)
+        print("MongoDB indexes ensured")
+
     async def close(self):
         """close mongodb connect"""
         if self.async_client:
             self.async_client.close()
         print("MongoDB connect is closed")
 
-mongodb = MongoDB()
\ No newline at end of file
+mongodb = MongoDB()
@@ -0,0 +1,88 @@
+import math, os, re, zlib
+from collections import Counter
+from typing import Dict, List
+from qdrant_client.models import SparseVector
+
+CJK_PATTERN = re.compile(r"[㐀-䶿一-鿿豈-﫿぀-ヿ가-힯]+")
+WORD_PATTERN = re.compile(r"[^\W_]+")
+
+class Bm25Helper:
+    """BM25 稀疏向量編碼，IDF 由 Qdrant 的 IDF modifier 在伺服器端計算"""
+
+    VECTOR_NAME = "bm25"
+
+    def __init__(self, k1: float = 1.2, b: float = 0.75, avg_doc_length: float = None):
+        self.k1 = k1
+        self.b = b
+        self.avg_doc_length = avg_doc_length or float(os.getenv("BM25_AVG_DOC_LENGTH", "256"))
+
+    def tokenize(self, text: str) -> List[str]:
+        """英文按詞切分，中日韓文字輸出單字與雙字詞"""
+        tokens = []
+        spaced = CJK_PATTERN.sub(lambda m: f" {m.group(0)} ", text.lower())
+        for segment in spaced.split():
+            if CJK_PATTERN.fullmatch(segment):
+                tokens.extend(segment)
+                tokens.extend(segment[i:i + 2] for i in range(len(segment) - 1))
+            else:
+                tokens.extend(WORD_PATTERN.findall(segment))
+        return tokens
+
+    @staticmethod
+    def token_index(token: str) -> int:
+        return zlib.crc32(token.encode("utf-8")) & 0xFFFFFFFF
+
+    def _to_sparse(self, weights: Dict[int, float]) -> SparseVector:
+        return SparseVector(indices=list(weights.keys()), values=list(weights.values()))
+
+    def term_frequency_weight(self, tf: int, doc_length: int, avg_doc_length: float) -> float:
+        norm = 1 - self.b + self.b * doc_length / avg_doc_length
+        return tf * (self.k1 + 1) / (tf + self.k1 * norm)
+
+    def encode_document(self, text: str) -> SparseVector:
+        tokens = self.tokenize(text)
+        counts = Counter(tokens)
+        weights: Dict[int, float] = {}
+        for token, tf in counts.items():
+            index = self.token_index(token)
+            weights[index] = weights.get(index, 0.0) + self.term_frequency_weight(tf, len(tokens), self.avg_doc_length)
+        return self._to_sparse(weights)
+
+    def encode_query(self, text: str) -> SparseVector:
+        weights: Dict[int, float] = {}
+        for token in set(self.tokenize(text)):
+            index = self.token_index(token)
+            weights[index] = 1.0
+        return self._to_sparse(weights)
+
+    def score_documents(self, query: str, texts: List[str]) -> List[float]:
+        """在本地對候選文本計算 BM25 (供未建立稀疏向量的舊集合使用)"""
+        query_terms = set(self.tokenize(query))
+        docs = [Counter(self.tokenize(text)) for text in texts]
+        if not query_terms or not docs:
+            return [0.0] * len(texts)
+
+        doc_lengths = [sum(doc.values()) for doc in docs]
+        avg_doc_length = (sum(doc_lengths) / len(docs)) or 1.0
+        total = len(docs)
+
+        idf = {}
+        for term in query_terms:
+            df = sum(1 for doc in docs if term in doc)
+            idf[term] = math.log(1 + (total - df + 0.5) / (df + 0.5))
+
+        scores = []
+        for doc, doc_length in zip(docs, doc_lengths):
+            score = 0.0
+            for term in query_terms:
+                if tf := doc.get(term):
+                    score += idf[term] * self.term_frequency_weight(tf, doc_length, avg_doc_length)
+            scores.append(score)
+        return scores
+
+    @staticmethod
+    def normalize_scores(scores: List[float]) -> List[float]:
+        top = max(scores, default=0.0)
+        if top <= 0:
+            return [0.0] * len(scores)
+        return [score / top for score in scores]
@@ -0,0 +1,149 @@
+import asyncio, os, tempfile
+from typing import AsyncIterator, IO, List
+from models.dto.resultdto import ResultDTO
+from models.request.vectorRequest import TextPoint
+from core.qdrant_client_init import qdrant_client
+
+class BulkUpsertHelper:
+    """NDJSON 串流匯入：分批嵌入並與 Qdrant upsert 管線化重疊執行"""
+
+    def __init__(self, vector_service):
+        self.vector_service = vector_service
+        self.BATCH_SIZE = int(os.getenv("BULK_UPSERT_BATCH_SIZE", "64"))
+        self.QUEUE_SIZE = int(os.getenv("BULK_UPSERT_QUEUE_SIZE", "2"))
+        self.SPOOL_MAX_MEMORY = int(os.getenv("BULK_UPSERT_SPOOL_MAX_MEMORY_BYTES", str(8 * 1024 * 1024)))
+        self.SPOOL_READ_SIZE = 64 * 1024
+
+    async def spool_body(self, body: AsyncIterator[bytes]) -> IO[bytes]:
+        """在回應開始前讀完整個請求本文；回應串流期間讀取 receive() 會與斷線偵測搶訊息而遺失資料"""
+        loop = asyncio.get_running_loop()
+        spool = tempfile.SpooledTemporaryFile(max_size=self.SPOOL_MAX_MEMORY)
+        try:
+            async for chunk in body:
+                if chunk:
+                    await loop.run_in_executor(None, spool.write, chunk)
+            await loop.run_in_executor(None, spool.seek, 0)
+        except BaseException:
+            spool.close()
+            raise
+        return spool
+
+    async def iter_spooled(self, spool: IO[bytes]) -> AsyncIterator[bytes]:
+        loop = asyncio.get_running_loop()
+        try:
+            while chunk := await loop.run_in_executor(None, spool.read, self.SPOOL_READ_SIZE):
+                yield chunk
+        finally:
+            spool.close()
+
+    @staticmethod
+    async def iter_ndjson_lines(body: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        buffer = b""
+        async for chunk in body:
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            for line in lines:
+                if line.strip():
+                    yield line
+        if buffer.strip():
+            yield buffer
+
+    @staticmethod
+    def format_event(result: ResultDTO) -> str:
+        return result.model_dump_json() + "\n"
+
+    async def _read_batches(self, body: AsyncIterator[bytes], embed_queue: asyncio.Queue):
+        try:
+            batch: List[str] = []
+            start_index = 0
+            async for line in self.iter_ndjson_lines(body):
+                batch.append(TextPoint.model_validate_json(line).text)
+                if len(batch) >= self.BATCH_SIZE:
+                    await embed_queue.put((start_index, batch))
+                    start_index += len(batch)
+                    batch = []
+
+            if batch:
+                await embed_queue.put((start_index, batch))
+            await embed_queue.put(None)
+        except Exception as e:
+            await embed_queue.put(e)
+
+    async def _embed_batches(self, collection_name: str, collection_meta: dict, id: int, existing: dict, embed_queue: asyncio.Queue, upsert_queue: asyncio.Queue):
+        try:
+            while (item := await embed_queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+
+                # 與 upsert_chunks 相同的內容雜湊比對：未變更的片段略過，位移的片段沿用向量
+                start_index, texts = item
+                prepared = await self.vector_service.prepare_chunk_points(collection_name, collection_meta, id, texts, existing, start_index)
+                await upsert_queue.put((start_index + len(texts), prepared))
+            await upsert_queue.put(None)
+        except Exception as e:
+            await upsert_queue.put(e)
+
+    async def run(self, collection_name: str, id: int, body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        embed_queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        upsert_queue = asyncio.Queue(maxsize=self.QUEUE_SIZE)
+        batches = 0
+        upserted = 0
+        skipped = 0
+        chunk_count = 0
+        tasks = []
+
+        try:
+            collection_meta = await self.vector_service.collection_registry.get(collection_name)
+            existing = await self.vector_service.get_existing_chunk_hashes(collection_name, id)
+            tasks = [
+                asyncio.create_task(self._read_batches(body, embed_queue)),
+                asyncio.create_task(self._embed_batches(collection_name, collection_meta, id, existing, embed_queue, upsert_queue))
+            ]
+
+            while (item := await upsert_queue.get()) is not None:
+                if isinstance(item, Exception):
+                    raise item
+
+                chunk_count, prepared = item
+                if prepared["points"]:
+                    await qdrant_client.client.upsert(
+                        collection_name=collection_name,
+                        points=prepared["points"]
+                    )
+                batches += 1
+                upserted += len(prepared["points"])
+                skipped += len(prepared["unchanged"])
+                print(f"批次匯入進度: 第 {batches} 批, 累計 {upserted} 個點, 略過 {skipped} 個")
+                yield self.format_event(ResultDTO.ok(
+                    message="progress",
+                    data={"batches": batches, "upserted": upserted, "skipped": skipped}
+                ))
+
+            if chunk_count == 0:
+                # 空本文會讓所有既有片段成為孤立點，視為錯誤而非清空文章
+                yield self.format_event(ResultDTO.fail(code=400, message="No points to upsert"))
+                return
+
+            # 串流完整結束後才刪除孤立點，中途失敗時保留舊資料
+            orphan_ids = self.vector_service.find_orphan_ids(collection_name, id, existing, chunk_count)
+            await self.vector_service.delete_points(collection_name, orphan_ids)
+
+            yield self.format_event(ResultDTO.ok(
+                message=f"Inserted {upserted} points, skipped {skipped} unchanged, deleted {len(orphan_ids)} orphans",
+                data={"batches": batches, "upserted": upserted, "skipped": skipped, "deleted": len(orphan_ids)}
+            ))
+
+        except Exception as e:
+            if error := self.vector_service.handle_collection_not_found(collection_name, e):
+                yield self.format_event(error)
+            else:
+                print(f"批次匯入失敗: {str(e)}")
+                yield self.format_event(ResultDTO.fail(
+                    code=500,
+                    message=f"Bulk upsert failed: {str(e)}",
+                    data={"batches": batches, "upserted": upserted, "skipped": skipped}
+                ))
+
+        finally:
+            for task in tasks:
+                task.cancel()
@@ -1,9 +1,19 @@
-from datetime import datetime
-from typing import Optional, Union
-from models.request.chatRequest import ChatRequest, SummaryRequest
+from datetime import datetime, timezone
+from typing import List, Optional, Union
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError
+from models.request.chatRequest import ChatHistoryQuery, ChatRequest, SummaryRequest
 from functools import partial
 from core.llm_init.prompt import PromptTemplates
-import asyncio
+from helper.sessionCacheHelper import SessionCacheHelper
+from helper.historyArchiveHelper import HistoryArchiveHelper
+import asyncio, os
+
+PERSISTED_COUNT_KEY = "_persisted_count"
+# 每次寫入遞增，用於判斷快取中的對話是否已被其他 worker 更新
+VERSION_KEY = "version"
+STALE_VERSION = -1
+MESSAGE_FIELDS = ["role", "content", "timestamp"]
 
 class ChatHistoryHelper:
     def __init__(self, db, prompt_templates: PromptTemplates, temperature=0.7, max_tokens=3000):
@@ -11,6 +21,10 @@ class ChatHistoryHelper:
         self.prompt_templates = prompt_templates
         self.temperature = temperature
         self.max_tokens = max_tokens
+        # embedded: 訊息存於 histories.messages；collection: 訊息逐筆存於 history_messages
+        self.STORAGE_MODE = os.getenv("CHAT_HISTORY_STORAGE", "embedded")
+        self.archive_helper = HistoryArchiveHelper(db, self.STORAGE_MODE)
+        self.session_cache = SessionCacheHelper(self.async_save) if os.getenv("CHAT_SESSION_CACHE_ENABLED", "true").lower() == "true" else None
 
     @staticmethod
     def get_current_timestamp() -> str:
@@ -42,19 +56,232 @@ class ChatHistoryHelper:
             }
         }
 
-    async def get_or_create(self, request: Union[ChatRequest, SummaryRequest]) -> dict:
-        chat_history = await self.db.histories.find_one(
-            {"chat_session_id": request.chat_session_id}
-        )
-        
+    async def load(self, chat_session_id: int) -> Optional[dict]:
+        chat_history = await self.db.histories.find_one({"chat_session_id": chat_session_id})
+        if not chat_history and await self.rehydrate(chat_session_id):
+            chat_history = await self.db.histories.find_one({"chat_session_id": chat_session_id})
         if not chat_history:
-            if isinstance(request, ChatRequest):
-                chat_history = self.CreateChatHistory(request)
-            elif isinstance(request, SummaryRequest):
-                chat_history = self.CreateSummaryHistory(request)
-        
+            return None
+
+        if self.STORAGE_MODE == "collection":
+            if "message_count" not in chat_history:
+                await self.migrate_embedded_messages(chat_history)
+            cursor = self.db.history_messages.find(
+                {"chat_session_id": chat_session_id},
+                {"_id": 0, "role": 1, "content": 1, "timestamp": 1}
+            ).sort("seq", 1)
+            chat_history["messages"] = await cursor.to_list(length=None)
+
+        chat_history[PERSISTED_COUNT_KEY] = len(chat_history.get("messages", []))
         return chat_history
+
+    async def rehydrate(self, chat_session_id: int) -> bool:
+        """未啟用封存且沒有封存資料時不查詢 histories_archive"""
+        return await self.archive_helper.has_archived_sessions() and await self.archive_helper.rehydrate(chat_session_id)
+
+    async def migrate_embedded_messages(self, chat_history: dict):
+        """切換至 collection 模式前建立的文件仍內嵌 messages，首次讀取時搬移至 history_messages"""
+        messages = chat_history.get("messages") or []
+        if messages:
+            try:
+                await self.db.history_messages.insert_many([
+                    {"chat_session_id": chat_history["chat_session_id"], "seq": seq, **message}
+                    for seq, message in enumerate(messages)
+                ], ordered=False)
+            except BulkWriteError as e:
+                # 其他 worker 已同時搬移，重複的 seq 可忽略
+                if any(error.get("code") != 11000 for error in e.details.get("writeErrors", [])):
+                    raise
+
+        # 設定 message_count 讓後續 $inc 從既有訊息數往後分配 seq
+        await self.db.histories.update_one(
+            {"chat_session_id": chat_history["chat_session_id"], "message_count": {"$exists": False}},
+            {"$set": {"message_count": len(messages)}, "$unset": {"messages": ""}}
+        )
+        chat_history["message_count"] = len(messages)
+        print(f"Migrated {len(messages)} embedded messages of session {chat_history['chat_session_id']} to history_messages")
+
+    async def load_page(self, chat_session_id: int, query: ChatHistoryQuery) -> Optional[dict]:
+        """以 seq 游標分頁讀取訊息，只投影需要的欄位"""
+        if self.session_cache:
+            await self.session_cache.flush_session(chat_session_id)
+
+        fields = list(dict.fromkeys(["role", *(query.fields or MESSAGE_FIELDS)]))
+        if self.STORAGE_MODE == "collection":
+            page = await self._load_page_from_collection(chat_session_id, query, fields)
+        else:
+            page = await self._load_page_from_document(chat_session_id, query, fields)
+        if page is None and await self.rehydrate(chat_session_id):
+            return await self.load_page(chat_session_id, query)
+        if page is None:
+            return None
+
+        messages = page["messages"]
+        if query.fields and "role" not in query.fields:
+            messages = [{key: value for key, value in msg.items() if key != "role"} for msg in messages]
+
+        return {
+            "response": messages,
+            "chat_session_id": chat_session_id,
+            "total": page["total"],
+            "has_more_before": page["has_more_before"],
+            "has_more_after": page["has_more_after"]
+        }
+
+    @staticmethod
+    def page_flags(query: ChatHistoryQuery, has_more: bool, has_outside: bool) -> dict:
+        """has_more 為掃描方向是否還有訊息，has_outside 為游標另一側是否有訊息"""
+        if query.after is not None:
+            return {"has_more_before": has_outside, "has_more_after": has_more}
+        return {"has_more_before": has_more, "has_more_after": has_outside}
+
+    async def _load_page_from_document(self, chat_session_id: int, query: ChatHistoryQuery, fields: List[str]) -> Optional[dict]:
+        # 先以原始索引作為 seq 並過濾 system 訊息，再套用游標與 limit，避免頁面不足
+        messages = {"$ifNull": ["$messages", []]}
+        indexed = {"$map": {
+            "input": {"$range": [0, {"$size": messages}]},
+            "as": "i",
+            "in": {"seq": "$$i", "m": {"$arrayElemAt": [messages, "$$i"]}}
+        }}
+        entries = indexed if query.include_system else {"$filter": {
+            "input": indexed, "as": "e", "cond": {"$ne": ["$$e.m.role", "system"]}
+        }}
+
+        if query.after is not None:
+            inside = {"$gt": ["$$e.seq", query.after]}
+        elif query.before is not None:
+            inside = {"$lt": ["$$e.seq", query.before]}
+        else:
+            inside = True
+        # 未指定 after 時從最新訊息往前取；window_size 超過 limit 代表掃描方向還有更多
+        if not query.limit:
+            window = "$window"
+        elif query.after is not None:
+            window = {"$slice": ["$window", query.limit]}
+        else:
+            window = {"$slice": ["$window", -query.limit]}
+
+        cursor = self.db.histories.aggregate([
+            {"$match": {"chat_session_id": chat_session_id}},
+            {"$limit": 1},
+            {"$project": {"_id": 0, "total": {"$size": messages}, "entries": entries}},
+            {"$project": {
+                "total": 1,
+                "window": {"$filter": {"input": "$entries", "as": "e", "cond": inside}},
+                "outside": {"$size": {"$filter": {"input": "$entries", "as": "e", "cond": {"$not": [inside]}}}}
+            }},
+            {"$project": {
+                "total": 1,
+                "outside": 1,
+                "window_size": {"$size": "$window"},
+                "messages": {"$map": {
+                    "input": window,
+                    "as": "e",
+                    "in": {"seq": "$$e.seq", **{field: f"$$e.m.{field}" for field in fields}}
+                }}
+            }}
+        ])
+        documents = await cursor.to_list(length=1)
+        if not documents:
+            return None
+
+        document = documents[0]
+        return {
+            "total": document["total"],
+            "messages": document["messages"],
+            **self.page_flags(query, bool(query.limit) and document["window_size"] > query.limit, document["outside"] > 0)
+        }
+
+    async def _load_page_from_collection(self, chat_session_id: int, query: ChatHistoryQuery, fields: List[str]) -> Optional[dict]:
+        header = await self.db.histories.find_one({"chat_session_id": chat_session_id}, {"message_count": 1})
+        if not header:
+            return None
+        if "message_count" not in header:
+            header = await self.db.histories.find_one({"chat_session_id": chat_session_id})
+            if not header:
+                return None
+            await self.migrate_embedded_messages(header)
+
+        base_filter = {"chat_session_id": chat_session_id}
+        if not query.include_system:
+            base_filter["role"] = {"$ne": "system"}
+
+        seq_filter = {}
+        outside_filter = None
+        if query.after is not None:
+            seq_filter["$gt"] = query.after
+            outside_filter = {**base_filter, "seq": {"$lte": query.after}}
+        if query.before is not None:
+            seq_filter["$lt"] = query.before
+            outside_filter = {**base_filter, "seq": {"$gte": query.before}}
+        message_filter = {**base_filter, "seq": seq_filter} if seq_filter else base_filter
+
+        # 未指定 after 時從最新訊息往前取，再反轉為時間順序；多取一筆判斷是否還有更多
+        descending = query.after is None and query.limit is not None
+        cursor = self.db.history_messages.find(
+            message_filter,
+            {"_id": 0, "seq": 1, **{field: 1 for field in fields}}
+        ).sort("seq", -1 if descending else 1)
+        if query.limit:
+            cursor = cursor.limit(query.limit + 1)
+
+        messages = await cursor.to_list(length=None)
+        has_more = bool(query.limit) and len(messages) > query.limit
+        messages = messages[:query.limit] if query.limit else messages
+        if descending:
+            messages.reverse()
+
+        has_outside = outside_filter is not None and await self.db.history_messages.find_one(outside_filter, {"_id": 1}) is not None
+        return {
+            "total": header.get("message_count", 0),
+            "messages": messages,
+            **self.page_flags(query, has_more, has_outside)
+        }
+
+    async def get_cached(self, chat_session_id: int) -> Optional[dict]:
+        """快取命中時不查詢資料庫；跨 worker 的刪除由訂閱事件清除，其餘最多過期 TTL 秒"""
+        chat_history = self.session_cache.get(chat_session_id)
+        if chat_history and chat_history.get(VERSION_KEY) == STALE_VERSION:
+            # 上次寫入時發現其他 worker 也寫過此對話，落盤後重新載入
+            await self.session_cache.flush_session(chat_session_id)
+            self.session_cache.invalidate([chat_session_id])
+            return None
+        return chat_history
+
+    async def get_or_create(self, request: Union[ChatRequest, SummaryRequest]) -> dict:
+        if not self.session_cache:
+            chat_history = await self.load(request.chat_session_id)
+            return chat_history or self.create(request)
+
+        # 持有對話鎖直到 finalize，同一對話的下一個回合需等待本回合寫回快取
+        await self.session_cache.acquire(request.chat_session_id)
+        try:
+            chat_history = await self.get_cached(request.chat_session_id)
+            if not chat_history:
+                chat_history = await self.load(request.chat_session_id)
+                if chat_history:
+                    self.session_cache.put(chat_history)
+            return chat_history or self.create(request)
+        except BaseException:
+            self.session_cache.release(request.chat_session_id)
+            raise
+
+    def create(self, request: Union[ChatRequest, SummaryRequest]) -> Optional[dict]:
+        if isinstance(request, ChatRequest):
+            return self.CreateChatHistory(request)
+        if isinstance(request, SummaryRequest):
+            return self.CreateSummaryHistory(request)
+        return None
     
+    async def delete_many(self, chat_session_ids: List[int]) -> int:
+        if self.session_cache:
+            self.session_cache.invalidate(chat_session_ids)
+        delete_result = await self.db.histories.delete_many({"chat_session_id": {"$in": chat_session_ids}})
+        if self.STORAGE_MODE == "collection":
+            await self.db.history_messages.delete_many({"chat_session_id": {"$in": chat_session_ids}})
+        archived_count = await self.archive_helper.delete_many(chat_session_ids)
+        return delete_result.deleted_count + archived_count
+
     def CreateChatHistory(self, request: ChatRequest) :
         return self.generate_chat_history(
             request.chat_session_id,
@@ -74,27 +301,83 @@ class ChatHistoryHelper:
     def append_message(self, chat_history: dict, content: str, role: str):
         chat_history["messages"].append(self.create_message(role, content))
 
-    async def async_save(self, chat_history: dict):
+    @staticmethod
+    def build_header(chat_history: dict) -> dict:
+        return {
+            "user_id": chat_history.get("user_id"),
+            "metadata": chat_history.get("metadata", {}),
+            "created_at": datetime.now(timezone.utc)
+        }
+
+    async def async_save(self, chat_history: dict) -> bool:
+        """只寫入本輪新增的訊息，避免每輪重寫整份文件；文件已被刪除時回傳 False"""
         if not chat_history:
-            return
+            return True
         
-        try:
-            session_id = chat_history.get("chat_session_id", "unknown")
-            if "_id" in chat_history:
-                await self.db.histories.replace_one(
-                    {"_id": chat_history["_id"]},
-                    chat_history,
-                    upsert=True 
-                )
-            else:
-                await self.db.histories.insert_one(chat_history)
-        except Exception as e:
-            raise
+        persisted_count = chat_history.get(PERSISTED_COUNT_KEY, 0)
+        pending_messages = chat_history["messages"][persisted_count:]
+        if not pending_messages:
+            return True
+
+        # 已落盤過的對話不再 upsert，避免刪除後被延遲寫入重新建立
+        upsert = persisted_count == 0
+        header = await self.save_pending(chat_history, pending_messages, upsert)
+        if header is None and await self.rehydrate(chat_history["chat_session_id"]):
+            # 載入後才被封存的對話，還原後再寫入本輪訊息
+            header = await self.save_pending(chat_history, pending_messages, upsert)
+        if header is None:
+            return False
+
+        chat_history[PERSISTED_COUNT_KEY] = persisted_count + len(pending_messages)
+        # 版本跳號代表期間有其他寫入者，記憶體中的副本已不完整
+        expected_version = chat_history.get(VERSION_KEY, 0) + 1
+        chat_history[VERSION_KEY] = header[VERSION_KEY] if header[VERSION_KEY] == expected_version else STALE_VERSION
+        return True
+
+    async def save_pending(self, chat_history: dict, pending_messages: list, upsert: bool) -> Optional[dict]:
+        if self.STORAGE_MODE == "collection":
+            return await self.save_to_collection(chat_history, pending_messages, upsert)
+        return await self.db.histories.find_one_and_update(
+            {"chat_session_id": chat_history["chat_session_id"]},
+            {
+                "$push": {"messages": {"$each": pending_messages}},
+                "$setOnInsert": self.build_header(chat_history),
+                "$set": {"last_activity": datetime.now(timezone.utc)},
+                "$inc": {VERSION_KEY: 1}
+            },
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+            projection={VERSION_KEY: 1}
+        )
+
+    async def save_to_collection(self, chat_history: dict, pending_messages: list, upsert: bool = True) -> Optional[dict]:
+        # 以 message_count 原子遞增分配 seq，並行寫入同一 session 也不會衝突
+        header = await self.db.histories.find_one_and_update(
+            {"chat_session_id": chat_history["chat_session_id"]},
+            {
+                "$inc": {"message_count": len(pending_messages), VERSION_KEY: 1},
+                "$setOnInsert": self.build_header(chat_history),
+                "$set": {"last_activity": datetime.now(timezone.utc)}
+            },
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER,
+            projection={"message_count": 1, VERSION_KEY: 1}
+        )
+        if header is None:
+            return None
+
+        first_seq = header["message_count"] - len(pending_messages)
+        await self.db.history_messages.insert_many([
+            {"chat_session_id": chat_history["chat_session_id"], "seq": first_seq + offset, **message}
+            for offset, message in enumerate(pending_messages)
+        ], ordered=False)
+        return header
 
     def log_save_result(self, task, chat_history: dict):
         session_id = chat_history.get("chat_session_id", "unknown")
         try:
-            task.result() 
+            if task.result() is False:
+                print(f"Session {session_id} no longer exists, dropped unsaved messages")
         except asyncio.CancelledError:
             pass
         except Exception as e:
@@ -107,7 +390,19 @@ class ChatHistoryHelper:
         if full_response:
             self.append_message(chat_history, full_response, "assistant")
         
+        if self.session_cache:
+            try:
+                return self.session_cache.mark_dirty(chat_history)
+            finally:
+                self.session_cache.release(chat_history["chat_session_id"])
+
         save_task = asyncio.create_task(self.async_save(chat_history))
         save_task.add_done_callback(
             partial(self.log_save_result, chat_history=chat_history)
         )
+        return save_task
+
+    async def close(self):
+        await self.archive_helper.close()
+        if self.session_cache:
+            await self.session_cache.close()
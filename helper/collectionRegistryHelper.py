@@ -0,0 +1,68 @@
+import os, time
+from typing import Dict, List, Optional
+from core.qdrant_client_init import qdrant_client
+
+def is_not_found_error(error: Exception) -> bool:
+    """判斷 Qdrant 例外是否為集合不存在 (REST 404 或 gRPC NOT_FOUND)"""
+    if getattr(error, "status_code", None) == 404:
+        return True
+
+    code = getattr(error, "code", None)
+    if callable(code):
+        try:
+            if getattr(code(), "name", None) == "NOT_FOUND":
+                return True
+        except Exception:
+            pass
+
+    message = str(error).lower()
+    return "collection" in message and ("not found" in message or "doesn't exist" in message)
+
+class CollectionRegistryHelper:
+    """每個 worker 的集合中繼資料快取，避免每次呼叫都查詢 collection_exists"""
+
+    def __init__(self, ttl_seconds: Optional[float] = None):
+        self.ttl_seconds = ttl_seconds or float(os.getenv("COLLECTION_REGISTRY_TTL_SECONDS", "300"))
+        self._collections: Dict[str, dict] = {}
+
+    async def get(self, collection_name: str) -> Optional[dict]:
+        entry = self._collections.get(collection_name)
+        if entry and entry["expires_at"] > time.monotonic():
+            return entry
+        return await self.refresh(collection_name)
+
+    async def refresh(self, collection_name: str) -> Optional[dict]:
+        try:
+            info = await qdrant_client.client.get_collection(collection_name)
+        except Exception as e:
+            if is_not_found_error(e):
+                self.invalidate(collection_name)
+                return None
+            raise
+
+        vectors = info.config.params.vectors
+        if isinstance(vectors, dict):
+            vectors = vectors.get("") or next(iter(vectors.values()), None)
+
+        return self.register(
+            collection_name,
+            vector_size=getattr(vectors, "size", None),
+            distance=getattr(vectors, "distance", None),
+            sparse_vectors=list((info.config.params.sparse_vectors or {}).keys()),
+            indexed_fields=list((info.payload_schema or {}).keys())
+        )
+
+    def register(self, collection_name: str, vector_size: Optional[int], distance, sparse_vectors: Optional[List[str]] = None, indexed_fields: Optional[List[str]] = None) -> dict:
+        entry = {
+            "name": collection_name,
+            "vector_size": vector_size,
+            "distance": distance,
+            "sparse_vectors": sparse_vectors or [],
+            "indexed_fields": indexed_fields or [],
+            "expires_at": time.monotonic() + self.ttl_seconds
+        }
+        self._collections[collection_name] = entry
+        return entry
+
+    def invalidate(self, collection_name: str):
+        self._collections.pop(collection_name, None)
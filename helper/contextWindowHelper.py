@@ -0,0 +1,61 @@
+import os
+from typing import List, Optional
+from helper.tokenCounterHelper import TokenCounterHelper
+
+class ContextWindowHelper:
+    """依 token 預算組裝送往 LLM 的訊息，保留最新的對話回合"""
+
+    MESSAGE_OVERHEAD_TOKENS = 4
+
+    def __init__(self, token_counter: TokenCounterHelper, max_tokens: int = 3000, context_window: Optional[int] = None, rag_reserve: Optional[int] = None):
+        self.token_counter = token_counter
+        self.max_tokens = max_tokens
+        self.context_window = context_window or int(os.getenv("CHAT_CONTEXT_WINDOW_TOKENS", "64000"))
+        self.rag_reserve = rag_reserve if rag_reserve is not None else int(os.getenv("CHAT_RAG_CONTEXT_RESERVE_TOKENS", "4000"))
+
+    def count_message(self, message: dict) -> int:
+        return self.token_counter.count(message.get("content") or "") + self.MESSAGE_OVERHEAD_TOKENS
+
+    def history_budget(self, system_tokens: int, use_rag: bool) -> int:
+        # 使用 RAG 時至少保留 rag_reserve 給檢索內容，避免歷史訊息擠掉上下文
+        reserved = max(system_tokens, self.rag_reserve) if use_rag else system_tokens
+        return max(self.context_window - self.max_tokens - reserved, 0)
+
+    def assemble(self, system_messages: List[dict], history_messages: List[dict], use_rag: bool = False) -> dict:
+        system_messages = [{"role": msg["role"], "content": msg["content"]} for msg in system_messages]
+        system_tokens = sum(self.count_message(msg) for msg in system_messages)
+        budget = self.history_budget(system_tokens, use_rag)
+
+        kept: List[dict] = []
+        used = 0
+        dropped_tokens = 0
+        dropped_messages = 0
+        for index in range(len(history_messages) - 1, -1, -1):
+            msg = history_messages[index]
+            tokens = self.count_message(msg)
+            # 最新一則訊息一律保留，其餘超出預算即停止
+            if kept and used + tokens > budget:
+                dropped_messages = index + 1
+                dropped_tokens = tokens + sum(self.count_message(m) for m in history_messages[:index])
+                break
+            kept.append({"role": msg["role"], "content": msg["content"]})
+            used += tokens
+
+        kept.reverse()
+        # 避免以孤立的 assistant 回覆開頭
+        while len(kept) > 1 and kept[0]["role"] == "assistant":
+            orphan = kept.pop(0)
+            tokens = self.count_message(orphan)
+            used -= tokens
+            dropped_tokens += tokens
+            dropped_messages += 1
+
+        if dropped_messages:
+            print(f"上下文裁剪: 丟棄 {dropped_messages} 則訊息, 共 {dropped_tokens} tokens (預算 {budget})")
+
+        return {
+            "messages": [*system_messages, *kept],
+            "prompt_tokens": system_tokens + used,
+            "dropped_messages": dropped_messages,
+            "dropped_tokens": dropped_tokens
+        }
@@ -0,0 +1,102 @@
+import asyncio, os
+from functools import partial
+from typing import Optional, Set
+from core.llm_init import deepseek
+from core.llm_init.prompt import PromptTemplates
+from helper.tokenCounterHelper import TokenCounterHelper
+
+class ConversationSummaryHelper:
+    """長對話滾動摘要：在請求結束後於背景壓縮較早的對話回合"""
+
+    def __init__(self, db, prompt_templates: PromptTemplates, token_counter: TokenCounterHelper):
+        self.db = db
+        self.prompt_templates = prompt_templates
+        self.token_counter = token_counter
+        self.TRIGGER_TOKENS = int(os.getenv("CHAT_SUMMARY_TRIGGER_TOKENS", "6000"))
+        self.KEEP_RECENT_MESSAGES = int(os.getenv("CHAT_SUMMARY_KEEP_RECENT_MESSAGES", "6"))
+        self.MAX_TOKENS = int(os.getenv("CHAT_SUMMARY_MAX_TOKENS", "800"))
+        self.TIMEOUT = float(os.getenv("CHAT_SUMMARY_TIMEOUT", "60"))
+        self._running: Set[int] = set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def pending_messages(self, chat_history: dict) -> list:
+        filtered_messages = [msg for msg in chat_history["messages"] if msg["role"] != "system"]
+        return filtered_messages[chat_history.get("summarized_count", 0):]
+
+    def needs_summary(self, chat_history: dict) -> bool:
+        pending = self.pending_messages(chat_history)
+        if len(pending) <= self.KEEP_RECENT_MESSAGES:
+            return False
+        return sum(self.token_counter.count(msg["content"]) for msg in pending) > self.TRIGGER_TOKENS
+
+    def schedule(self, chat_history: Optional[dict], save_task: Optional[asyncio.Task] = None):
+        """於 finalize 之後呼叫，不阻塞串流回應"""
+        if not chat_history or not self.needs_summary(chat_history):
+            return
+
+        session_id = chat_history["chat_session_id"]
+        if session_id in self._running:
+            return
+
+        self._running.add(session_id)
+        task = asyncio.create_task(self.summarize(chat_history, save_task))
+        self._tasks.add(task)
+        task.add_done_callback(partial(self._on_done, session_id=session_id))
+
+    def _on_done(self, task: asyncio.Task, session_id: int):
+        self._tasks.discard(task)
+        self._running.discard(session_id)
+
+    @staticmethod
+    def format_transcript(messages: list) -> str:
+        labels = {"user": "使用者", "assistant": "助理"}
+        return "\n".join(f"{labels.get(msg['role'], msg['role'])}: {msg['content']}" for msg in messages)
+
+    async def summarize(self, chat_history: dict, save_task: Optional[asyncio.Task] = None):
+        try:
+            # 等待本輪對話寫入完成，避免摘要寫入早於文件建立
+            if save_task:
+                # shield 避免逾時取消共用的寫入 future
+                await asyncio.wait_for(asyncio.shield(save_task), self.TIMEOUT)
+
+            pending = self.pending_messages(chat_history)
+            to_summarize = pending[:len(pending) - self.KEEP_RECENT_MESSAGES]
+            if not to_summarize:
+                return
+
+            response = await asyncio.wait_for(
+                deepseek.client.chat.completions.create(
+                    model="deepseek-chat",
+                    messages=[
+                        {"role": "system", "content": self.prompt_templates.conversation_summarizer(chat_history.get("summary")).strip()},
+                        {"role": "user", "content": self.format_transcript(to_summarize)}
+                    ],
+                    max_tokens=self.MAX_TOKENS,
+                    temperature=0.3,
+                    stream=False
+                ),
+                timeout=self.TIMEOUT
+            )
+            summary = (response.choices[0].message.content or "").strip()
+            if not summary:
+                return
+
+            summarized_count = chat_history.get("summarized_count", 0) + len(to_summarize)
+            # 摘要欄位不影響訊息內容，不遞增 version，避免快取中的 session 被誤判為過期
+            await self.db.histories.update_one(
+                {"chat_session_id": chat_history["chat_session_id"]},
+                {"$set": {"summary": summary, "summarized_count": summarized_count}}
+            )
+            # 同步更新記憶體中的對話，讓快取中的 session 下一輪即可使用新摘要
+            chat_history["summary"] = summary
+            chat_history["summarized_count"] = summarized_count
+            print(f"對話摘要完成: session {chat_history['chat_session_id']}, 已摘要 {summarized_count} 則訊息")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"對話摘要失敗: {str(e)}")
+
+    async def close(self):
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
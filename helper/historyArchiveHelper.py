@@ -0,0 +1,228 @@
+import asyncio, os, orjson, uuid
+import zstandard as zstd
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from bson import Binary, ObjectId
+from pymongo import ASCENDING
+from pymongo.errors import DuplicateKeyError
+
+HEADER_FIELDS = ["user_id", "metadata", "summary", "summarized_count", "created_at", "last_activity"]
+
+class HistoryArchiveHelper:
+    """將長期未活動的對話以 zstd 壓縮搬移至 histories_archive，讀取時自動還原"""
+
+    def __init__(self, db, storage_mode: str = "embedded"):
+        self.db = db
+        self.storage_mode = storage_mode
+        self.ENABLED = os.getenv("CHAT_ARCHIVE_ENABLED", "false").lower() == "true"
+        self.ARCHIVE_AFTER_DAYS = float(os.getenv("CHAT_ARCHIVE_AFTER_DAYS", "30"))
+        self.INTERVAL_SECONDS = float(os.getenv("CHAT_ARCHIVE_INTERVAL_SECONDS", "3600"))
+        self.BATCH_SIZE = int(os.getenv("CHAT_ARCHIVE_BATCH_SIZE", "100"))
+        self.CLAIM_TIMEOUT_SECONDS = float(os.getenv("CHAT_ARCHIVE_CLAIM_TIMEOUT_SECONDS", "600"))
+        # collection 模式不使用 TTL 索引，改由排程同時刪除 histories 與 history_messages
+        self.HISTORY_TTL_DAYS = float(os.getenv("MONGODB_HISTORY_TTL_DAYS", "0"))
+        self.EXPIRY_ENABLED = self.storage_mode == "collection" and self.HISTORY_TTL_DAYS > 0
+        self.compressor = zstd.ZstdCompressor(level=int(os.getenv("CHAT_ARCHIVE_ZSTD_LEVEL", "10")))
+        self.decompressor = zstd.ZstdDecompressor()
+        self.archive_task: Optional[asyncio.Task] = None
+        self._has_archived: Optional[bool] = None
+
+    def compress_messages(self, messages: list) -> Binary:
+        return Binary(self.compressor.compress(orjson.dumps(messages)))
+
+    def decompress_messages(self, blob: bytes) -> list:
+        return orjson.loads(self.decompressor.decompress(blob))
+
+    async def _load_messages(self, chat_history: dict) -> list:
+        if self.storage_mode != "collection":
+            return chat_history.get("messages", [])
+        cursor = self.db.history_messages.find(
+            {"chat_session_id": chat_history["chat_session_id"]},
+            {"_id": 0, "chat_session_id": 0, "seq": 0}
+        ).sort("seq", ASCENDING)
+        # 切換模式前建立且尚未搬移的文件，訊息仍內嵌於 histories
+        return await cursor.to_list(length=None) or chat_history.get("messages", [])
+
+    @staticmethod
+    def activity_filter(chat_history: dict) -> dict:
+        """比對讀取時的活動狀態；舊文件沒有 last_activity 欄位"""
+        if "last_activity" in chat_history:
+            return {"last_activity": chat_history["last_activity"]}
+        return {"last_activity": {"$exists": False}}
+
+    def claimable_filter(self) -> dict:
+        stale_before = datetime.now(timezone.utc) - timedelta(seconds=self.CLAIM_TIMEOUT_SECONDS)
+        return {"$or": [
+            {"archive_token": {"$exists": False}},
+            {"archive_claimed_at": {"$lt": stale_before}}
+        ]}
+
+    def cold_filter(self, cutoff: datetime) -> dict:
+        # 舊文件沒有 last_activity，退回 created_at 或 _id 的建立時間
+        return {"$and": [
+            {"$or": [
+                {"last_activity": {"$lt": cutoff}},
+                {"last_activity": {"$exists": False}, "created_at": {"$lt": cutoff}},
+                {"last_activity": {"$exists": False}, "created_at": {"$exists": False}, "_id": {"$lt": ObjectId.from_datetime(cutoff)}}
+            ]},
+            self.claimable_filter()
+        ]}
+
+    async def archive_session(self, chat_history: dict) -> bool:
+        chat_session_id = chat_history["chat_session_id"]
+        token = uuid.uuid4().hex
+
+        # 先以 token 原子認領，確保同一時間只有一個行程封存此對話
+        claimed = await self.db.histories.find_one_and_update(
+            {"_id": chat_history["_id"], **self.activity_filter(chat_history), **self.claimable_filter()},
+            {"$set": {"archive_token": token, "archive_claimed_at": datetime.now(timezone.utc)}},
+            projection={"_id": 1}
+        )
+        if not claimed:
+            return False
+
+        messages = await self._load_messages(chat_history)
+        await self.db.histories_archive.replace_one(
+            {"chat_session_id": chat_session_id},
+            {
+                "chat_session_id": chat_session_id,
+                **{field: chat_history[field] for field in HEADER_FIELDS if field in chat_history},
+                "message_count": len(messages),
+                "messages_zstd": self.compress_messages(messages),
+                "archive_token": token,
+                "archived_at": datetime.now(timezone.utc)
+            },
+            upsert=True
+        )
+
+        # 僅在封存期間沒有新活動時才刪除原文件
+        delete_result = await self.db.histories.delete_one({
+            "_id": chat_history["_id"],
+            "archive_token": token,
+            **self.activity_filter(chat_history)
+        })
+        if delete_result.deleted_count == 0:
+            # 只回滾本次寫入的封存文件，並釋放認領
+            await self.db.histories_archive.delete_one({"chat_session_id": chat_session_id, "archive_token": token})
+            await self.db.histories.update_one(
+                {"_id": chat_history["_id"], "archive_token": token},
+                {"$unset": {"archive_token": "", "archive_claimed_at": ""}}
+            )
+            return False
+
+        if self.storage_mode == "collection":
+            await self.db.history_messages.delete_many({"chat_session_id": chat_session_id})
+        return True
+
+    async def archive_cold_sessions(self) -> int:
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.ARCHIVE_AFTER_DAYS)
+        archived = 0
+        while True:
+            cursor = self.db.histories.find(self.cold_filter(cutoff)).limit(self.BATCH_SIZE)
+            batch = await cursor.to_list(length=self.BATCH_SIZE)
+            if not batch:
+                break
+
+            results = await asyncio.gather(*(self.archive_session(chat_history) for chat_history in batch), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    print(f"Archive session failed: {str(result)}")
+            succeeded = sum(1 for result in results if result is True)
+            archived += succeeded
+            if succeeded == 0:
+                break
+
+        if archived:
+            print(f"Archived {archived} cold chat sessions")
+        return archived
+
+    async def expire_inactive_sessions(self) -> int:
+        """刪除超過保存期限的對話及其訊息，對應 embedded 模式的 TTL 索引"""
+        cutoff = datetime.now(timezone.utc) - timedelta(days=self.HISTORY_TTL_DAYS)
+        expired = 0
+        while True:
+            cursor = self.db.histories.find({"last_activity": {"$lt": cutoff}}, {"chat_session_id": 1}).limit(self.BATCH_SIZE)
+            chat_session_ids = [doc["chat_session_id"] for doc in await cursor.to_list(length=self.BATCH_SIZE)]
+            if not chat_session_ids:
+                break
+
+            delete_result = await self.db.histories.delete_many({
+                "chat_session_id": {"$in": chat_session_ids},
+                "last_activity": {"$lt": cutoff}
+            })
+            # 期間重新活躍的對話不會被刪除，只清除已刪除對話的訊息
+            remaining = set(await self.db.histories.distinct("chat_session_id", {"chat_session_id": {"$in": chat_session_ids}}))
+            deleted_ids = [chat_session_id for chat_session_id in chat_session_ids if chat_session_id not in remaining]
+            if deleted_ids:
+                await self.db.history_messages.delete_many({"chat_session_id": {"$in": deleted_ids}})
+            expired += delete_result.deleted_count
+            if delete_result.deleted_count == 0:
+                break
+
+        if expired:
+            print(f"Expired {expired} inactive chat sessions")
+        return expired
+
+    async def has_archived_sessions(self) -> bool:
+        """停用封存時只在 histories_archive 仍留有舊封存資料時才需要還原"""
+        if self.ENABLED:
+            return True
+        if self._has_archived is None:
+            self._has_archived = await self.db.histories_archive.find_one({}, {"_id": 1}) is not None
+        return self._has_archived
+
+    async def rehydrate(self, chat_session_id: int) -> bool:
+        """若對話已封存則還原回 histories，回傳是否有還原"""
+        archived = await self.db.histories_archive.find_one({"chat_session_id": chat_session_id})
+        if not archived:
+            return False
+
+        messages = self.decompress_messages(archived["messages_zstd"])
+        header = {field: archived[field] for field in HEADER_FIELDS if field in archived}
+        header["last_activity"] = datetime.now(timezone.utc)
+        try:
+            if self.storage_mode == "collection":
+                await self.db.histories.insert_one({"chat_session_id": chat_session_id, **header, "message_count": len(messages)})
+                if messages:
+                    await self.db.history_messages.insert_many([
+                        {"chat_session_id": chat_session_id, "seq": seq, **message}
+                        for seq, message in enumerate(messages)
+                    ], ordered=False)
+            else:
+                await self.db.histories.insert_one({"chat_session_id": chat_session_id, **header, "messages": messages})
+        except DuplicateKeyError:
+            # 其他請求已同時完成還原
+            pass
+
+        await self.db.histories_archive.delete_one({"_id": archived["_id"]})
+        print(f"Rehydrated archived chat session {chat_session_id}")
+        return True
+
+    async def delete_many(self, chat_session_ids: list) -> int:
+        delete_result = await self.db.histories_archive.delete_many({"chat_session_id": {"$in": chat_session_ids}})
+        return delete_result.deleted_count
+
+    def start(self):
+        if not (self.ENABLED or self.EXPIRY_ENABLED) or (self.archive_task and not self.archive_task.done()):
+            return
+        self.archive_task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                if self.EXPIRY_ENABLED:
+                    await self.expire_inactive_sessions()
+                if self.ENABLED:
+                    await self.archive_cold_sessions()
+            except Exception as e:
+                print(f"Archive job error: {str(e)}")
+            await asyncio.sleep(self.INTERVAL_SECONDS)
+
+    async def close(self):
+        if self.archive_task and not self.archive_task.done():
+            self.archive_task.cancel()
+            try:
+                await self.archive_task
+            except asyncio.CancelledError:
+                pass
+        self.archive_task = None
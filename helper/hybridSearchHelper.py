@@ -1,9 +1,11 @@
-from typing import List
+import asyncio, os
+from typing import Awaitable, List, Optional
 from models.dto.resultdto import ResultDTO
 from models.response.vectorResponse import VectorSearchResult
 from core.qdrant_client_init import qdrant_client  
 from qdrant_client.models import Filter, FieldCondition, MatchValue, MatchText
 from qdrant_client.http import models as qdrant_models
+from helper.bm25Helper import Bm25Helper
 
 class HybridSearchHelper:
     def __init__(self, vector_service):
@@ -11,6 +13,8 @@ class HybridSearchHelper:
         self.HARDCODE_LIMIT = 5
         self.HARDCODE_MIN_SCORE = 0.2
         self.VECTOR_DIM = 768
+        self.BRANCH_TIMEOUT = float(os.getenv("HYBRID_SEARCH_BRANCH_TIMEOUT", "3.0"))
+        self.KEYWORD_CANDIDATE_LIMIT = 200
       
     async def hybrid_search(
         self,
@@ -25,17 +29,26 @@ class HybridSearchHelper:
         混合搜尋：結合向量搜尋和關鍵字搜尋
         """
         try:
-            # 1. 執行向量搜尋
-            vector_results = await self._vector_search(
-                collection_name, query_text, article_id
-            )
+            # 1. 只檢查一次集合是否存在
+            if error := await self.vector_service.check_collection_exists(collection_name):
+                print(f"[ERROR] 集合檢查失敗: {error}")
+                return ResultDTO.ok(data=[])
           
-            # 2. 執行關鍵字搜尋 
-            keyword_results = None
-            if use_keyword_search:
-                keyword_results = await self._keyword_search(
-                    collection_name, query_text, article_id
+            # 2. 並行執行向量搜尋與關鍵字搜尋
+            branches = [
+                self._run_branch(
+                    "向量搜尋",
+                    self._vector_search(collection_name, query_text, article_id, check_collection=False)
                 )
+            ]
+            if use_keyword_search:
+                branches.append(self._run_branch(
+                    "關鍵字搜尋",
+                    self._keyword_search(collection_name, query_text, article_id, check_collection=False)
+                ))
+          
+            vector_results, *rest = await asyncio.gather(*branches)
+            keyword_results = rest[0] if rest else None
           
             # 3. 合併結果
             final_results = await self._merge_results(
@@ -51,16 +64,29 @@ class HybridSearchHelper:
             print(f"混合搜尋失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=str(e))
   
+    async def _run_branch(
+        self,
+        branch_name: str,
+        search: Awaitable[ResultDTO[List[VectorSearchResult]]]
+    ) -> Optional[ResultDTO[List[VectorSearchResult]]]:
+        """在期限內執行單一檢索分支，逾時則降級返回 None"""
+        try:
+            return await asyncio.wait_for(search, timeout=self.BRANCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            print(f"[WARN] {branch_name}超過 {self.BRANCH_TIMEOUT}s，降級略過此分支")
+            return None
+  
     async def _vector_search(
         self,
         collection_name: str,
         query_text: str,
-        article_id: int
+        article_id: int,
+        check_collection: bool = True
     ) -> ResultDTO[List[VectorSearchResult]]:
         """純向量搜尋"""
         try:
             # 檢查集合是否存在
-            if error := await self.vector_service.check_collection_exists(collection_name):
+            if check_collection and (error := await self.vector_service.check_collection_exists(collection_name)):
                 print(f"[ERROR] 集合檢查失敗: {error}")
                 return error
           
@@ -82,6 +108,7 @@ class HybridSearchHelper:
                 collection_name=collection_name,
                 query_vector=query_vector,
                 query_filter=search_filter,
+                search_params=self.vector_service.build_search_params(),
                 limit=self.HARDCODE_LIMIT * 3,  # 取更多結果用於混合
                 score_threshold=self.HARDCODE_MIN_SCORE
             )
@@ -98,6 +125,8 @@ class HybridSearchHelper:
             return ResultDTO.ok(data=results)
           
         except Exception as e:
+            if error := self.vector_service.handle_collection_not_found(collection_name, e):
+                return error
             print(f"向量搜尋失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=str(e))
   
@@ -105,59 +134,48 @@ class HybridSearchHelper:
         self,
         collection_name: str,
         query_text: str,
-        article_id: int
+        article_id: int,
+        check_collection: bool = True
     ) -> ResultDTO[List[VectorSearchResult]]:
         """關鍵字搜尋"""
         try:
             # 檢查集合是否存在
-            if error := await self.vector_service.check_collection_exists(collection_name):
+            if check_collection and (error := await self.vector_service.check_collection_exists(collection_name)):
                 print(f"[ERROR] 集合檢查失敗: {error}")
                 return error
           
-            # 建立關鍵字搜尋過濾條件
-            search_filter = Filter(
-                must=[
-                    FieldCondition(
-                        key="id",
-                        match=MatchValue(value=article_id)
-                    ),
-                    FieldCondition(
-                        key="text",
-                        match=MatchText(text=query_text)
-                    )
-                ]
-            )
-          
-            # 使用 qdrant_client 執行 scroll
-            all_records = []
-            next_offset = None
+            query_vector = self.vector_service.bm25_helper.encode_query(query_text)
+            if not query_vector.indices:
+                return ResultDTO.ok(data=[])
           
-            while True:
-                response = await qdrant_client.client.scroll(
+            collection_meta = await self.vector_service.collection_registry.get(collection_name)
+            if collection_meta and Bm25Helper.VECTOR_NAME in collection_meta["sparse_vectors"]:
+                # 伺服器端 BM25 稀疏向量檢索，只取回 top-k
+                response = await qdrant_client.client.query_points(
                     collection_name=collection_name,
-                    scroll_filter=search_filter,
-                    limit=100,
-                    offset=next_offset,
+                    query=query_vector,
+                    using=Bm25Helper.VECTOR_NAME,
+                    query_filter=self.vector_service.build_search_filter(article_id),
+                    limit=self.HARDCODE_LIMIT * 3,
                     with_payload=True
                 )
-              
-                records, next_offset = response
-                if not records:
-                    break
-                  
-                all_records.extend(records)
-                if next_offset is None:
-                    break
+                records = response.points
+                scores = [point.score for point in records]
+            else:
+                # 舊集合沒有稀疏向量：以全文索引取候選，本地計算 BM25
+                records = await self._scroll_keyword_candidates(collection_name, query_text, article_id)
+                scores = self.vector_service.bm25_helper.score_documents(
+                    query_text,
+                    [record.payload.get("text", "") for record in records]
+                )
           
-            # 計算關鍵字相關性分數
+            # 將 BM25 分數正規化至 0~1 以便與向量分數合併
             results = []
-            for record in all_records:
+            for record, score in zip(records, self.vector_service.bm25_helper.normalize_scores(scores)):
                 text = record.payload.get("text", "")
                 if not text.strip():
                     continue
               
-                # 計算關鍵字匹配分數
-                score = self._calculate_keyword_score(query_text, text)
                 if score > 0.1:  # 設定關鍵字分數閾值
                     formatted = self.vector_service.format_result_text(
                         point_id=record.id,
@@ -168,39 +186,42 @@ class HybridSearchHelper:
                         score=score
                     ))
           
+            results.sort(key=lambda x: x.score, reverse=True)
             return ResultDTO.ok(data=results)
           
         except Exception as e:
+            if error := self.vector_service.handle_collection_not_found(collection_name, e):
+                return error
             print(f"關鍵字搜尋失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=str(e))
   
-    def _calculate_keyword_score(self, query: str, text: str) -> float:
-        """計算關鍵字匹配分數"""
-        query_terms = set(query.lower().split())
-        text_terms = set(text.lower().split())
-      
-        if not query_terms:
-            return 0.0
-      
-        # 計算 Jaccard 相似度
-        intersection = query_terms.intersection(text_terms)
-        union = query_terms.union(text_terms)
-      
-        jaccard_sim = len(intersection) / len(union) if union else 0.0
-      
-        # 計算詞頻分數
-        tf_score = 0.0
-        text_words = text.lower().split()
-        total_words = len(text_words)
-      
-        if total_words > 0:
-            for term in query_terms:
-                term_count = text_words.count(term)
-                tf_score += term_count / total_words
+    async def _scroll_keyword_candidates(
+        self,
+        collection_name: str,
+        query_text: str,
+        article_id: int
+    ) -> list:
+        """以全文索引過濾取得關鍵字候選，數量上限為 KEYWORD_CANDIDATE_LIMIT"""
+        search_filter = Filter(
+            must=[
+                FieldCondition(
+                    key="id",
+                    match=MatchValue(value=article_id)
+                ),
+                FieldCondition(
+                    key="text",
+                    match=MatchText(text=query_text)
+                )
+            ]
+        )
       
-        # 綜合分數
-        final_score = (jaccard_sim * 0.6) + (tf_score * 0.4)
-        return min(final_score, 1.0)
+        records, _ = await qdrant_client.client.scroll(
+            collection_name=collection_name,
+            scroll_filter=search_filter,
+            limit=self.KEYWORD_CANDIDATE_LIMIT,
+            with_payload=True
+        )
+        return records
   
     async def _merge_results(
         self,
@@ -258,18 +279,17 @@ class HybridSearchHelper:
         # 限制返回數量
         return merged_results[:self.HARDCODE_LIMIT]
   
-    def _extract_point_id(self, formatted_text: str) -> int:
-        """從格式化文本中提取點 ID"""
+    def _extract_point_id(self, formatted_text: str) -> str:
+        """從格式化文本中提取點 ID (整數或 UUID)"""
         try:
             # 格式: [相關資料 {point_id}] 文本內容
             if formatted_text.startswith("[相關資料 "):
                 start = formatted_text.find("[相關資料 ") + 6
                 end = formatted_text.find("]", start)
-                point_id_str = formatted_text[start:end].strip()
-                return int(point_id_str)
+                return formatted_text[start:end].strip()
         except:
             pass
-        return 0
+        return ""
   
     async def hybrid_search_with_rerank(
         self,
@@ -1,13 +1,24 @@
-import json
 import asyncio
+import orjson
 from typing import Callable, Optional
 from fastapi.responses import StreamingResponse
 from core.llm_init import deepseek
+from core.llm_init.prompt import PromptTemplates
+from helper.contextWindowHelper import ContextWindowHelper
+from helper.tokenCounterHelper import token_counter
+
+SSE_DATA_PREFIX = b"data: "
+SSE_ERROR_PREFIX = b"event: error\ndata: "
+SSE_EVENT_SUFFIX = b"\n\n"
 
 class LLMStreamHelper:
-    def __init__(self, temperature=0.7, max_tokens=3000):
+    END_EVENT = b"event: end\ndata: {}\n\n"
+
+    def __init__(self, temperature=0.7, max_tokens=3000, prompt_templates: Optional[PromptTemplates] = None):
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.prompt_templates = prompt_templates or PromptTemplates()
+        self.context_window_helper = ContextWindowHelper(token_counter, max_tokens=max_tokens)
 
     def generate_enhanced_messages(
         self, 
@@ -17,8 +28,27 @@ class LLMStreamHelper:
     ):
         context_str = "\n".join([item.text for item in search_result.data])
         system_prompt = prompt_function(context_str)
+        summary_messages, recent_messages = self.split_history(chat_history)
+        return self.context_window_helper.assemble(
+            [self.create_base_message("system", system_prompt), *summary_messages],
+            recent_messages,
+            use_rag=True
+        )["messages"]
+
+    def generate_history_messages(self, chat_history: dict):
+        system_messages = [msg for msg in chat_history["messages"] if msg["role"] == "system"]
+        summary_messages, recent_messages = self.split_history(chat_history)
+        return self.context_window_helper.assemble([*system_messages, *summary_messages], recent_messages)["messages"]
+
+    def split_history(self, chat_history: dict):
+        """已摘要的舊訊息以一則系統摘要取代，只保留尚未摘要的訊息"""
         filtered_messages = [msg for msg in chat_history["messages"] if msg["role"] != "system"]
-        return [self.create_base_message("system", system_prompt), *filtered_messages]
+        summary = chat_history.get("summary")
+        if not summary:
+            return [], filtered_messages
+        
+        summary_message = self.create_base_message("system", self.prompt_templates.conversation_summary_context(summary))
+        return [summary_message], filtered_messages[chat_history.get("summarized_count", 0):]
 
     @staticmethod
     def create_base_message(role: str, content: str) -> dict:
@@ -60,14 +90,14 @@ class LLMStreamHelper:
                 if content := getattr(chunk.choices[0].delta, 'content', None):
                     buffer += content
                     try:
-                        yield await self.generate_event_data(buffer), buffer
+                        yield self.generate_event_data(buffer), buffer
                         buffer = ""
                     except Exception as e:
                         client_disconnected[0] = True
                         raise e
 
             if buffer:
-                yield await self.generate_event_data(buffer), buffer
+                yield self.generate_event_data(buffer), buffer
 
         finally:
             if llm_task and not llm_task.done():
@@ -78,13 +108,12 @@ class LLMStreamHelper:
                     pass
 
     @staticmethod
-    async def generate_event_data(content: str) -> str:
-        data = await asyncio.to_thread(json.dumps, {"content": content})
-        return f"data: {data}\n\n"
+    def generate_event_data(content: str) -> bytes:
+        return SSE_DATA_PREFIX + orjson.dumps({"content": content}) + SSE_EVENT_SUFFIX
 
     @staticmethod
-    def generate_error_event(error_msg: str) -> str:
-        return f"event: error\ndata: {json.dumps({'message': error_msg})}\n\n"
+    def generate_error_event(error_msg: str) -> bytes:
+        return SSE_ERROR_PREFIX + orjson.dumps({"message": error_msg}) + SSE_EVENT_SUFFIX
 
     @staticmethod
     def create_streaming_response(event_stream):
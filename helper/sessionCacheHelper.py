@@ -0,0 +1,168 @@
+import asyncio, os, time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+class SessionCacheHelper:
+    """每個 worker 的對話快取：讀取走記憶體，寫入合併後定期批次落盤 (write-behind)"""
+
+    def __init__(self, save: Callable[[dict], Awaitable[bool]], max_entries: Optional[int] = None, ttl_seconds: Optional[float] = None, flush_interval_ms: Optional[float] = None):
+        self.save = save
+        self.max_entries = max_entries or int(os.getenv("CHAT_SESSION_CACHE_MAX_ENTRIES", "1000"))
+        self.ttl_seconds = ttl_seconds or float(os.getenv("CHAT_SESSION_CACHE_TTL_SECONDS", "60"))
+        self.flush_interval = (flush_interval_ms or float(os.getenv("CHAT_SESSION_FLUSH_INTERVAL_MS", "500"))) / 1000
+        self._entries: "OrderedDict[int, tuple]" = OrderedDict()
+        self._dirty: Dict[int, asyncio.Future] = {}
+        self._flush_lock: Optional[asyncio.Lock] = None
+        # 同一對話的回合依序進行，避免兩個回合交錯追加到同一份快取
+        self._session_locks: Dict[int, asyncio.Lock] = {}
+        self._session_lock_users: Dict[int, int] = {}
+        self.flush_task: Optional[asyncio.Task] = None
+
+    def start(self):
+        if self.flush_task and not self.flush_task.done():
+            return
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        self.flush_task = asyncio.create_task(self._run())
+
+    def get(self, chat_session_id: int) -> Optional[dict]:
+        entry = self._entries.get(chat_session_id)
+        if entry is None:
+            return None
+
+        chat_history, expires_at = entry
+        if expires_at < time.monotonic() and chat_session_id not in self._dirty:
+            del self._entries[chat_session_id]
+            return None
+
+        self._entries.move_to_end(chat_session_id)
+        return chat_history
+
+    def put(self, chat_history: dict):
+        chat_session_id = chat_history["chat_session_id"]
+        # TTL 從載入時起算，持續使用也不延長，確保定期重新載入
+        entry = self._entries.get(chat_session_id)
+        expires_at = entry[1] if entry and entry[0] is chat_history else time.monotonic() + self.ttl_seconds
+        self._entries[chat_session_id] = (chat_history, expires_at)
+        self._entries.move_to_end(chat_session_id)
+        self._evict()
+
+    def _evict(self):
+        # 只淘汰已落盤的項目，尚未寫入的留待下次 flush
+        for chat_session_id in list(self._entries):
+            if len(self._entries) <= self.max_entries:
+                break
+            if chat_session_id not in self._dirty:
+                del self._entries[chat_session_id]
+
+    def mark_dirty(self, chat_history: dict) -> asyncio.Future:
+        """回傳在該對話寫入完成後結束的 future"""
+        self.put(chat_history)
+        self.start()
+        chat_session_id = chat_history["chat_session_id"]
+        if chat_session_id not in self._dirty:
+            self._dirty[chat_session_id] = asyncio.get_running_loop().create_future()
+        return self._dirty[chat_session_id]
+
+    async def acquire(self, chat_session_id: int):
+        lock = self._session_locks.setdefault(chat_session_id, asyncio.Lock())
+        self._session_lock_users[chat_session_id] = self._session_lock_users.get(chat_session_id, 0) + 1
+        try:
+            await lock.acquire()
+        except BaseException:
+            self._drop_lock_user(chat_session_id)
+            raise
+
+    def release(self, chat_session_id: int):
+        lock = self._session_locks.get(chat_session_id)
+        if lock is None or not lock.locked():
+            return
+        lock.release()
+        self._drop_lock_user(chat_session_id)
+
+    def _drop_lock_user(self, chat_session_id: int):
+        users = self._session_lock_users.get(chat_session_id, 1) - 1
+        if users > 0:
+            self._session_lock_users[chat_session_id] = users
+        else:
+            self._session_lock_users.pop(chat_session_id, None)
+            self._session_locks.pop(chat_session_id, None)
+
+    def invalidate(self, chat_session_ids: Iterable[int]):
+        for chat_session_id in chat_session_ids:
+            self._entries.pop(chat_session_id, None)
+            if future := self._dirty.pop(chat_session_id, None):
+                future.cancel()
+
+    async def flush_session(self, chat_session_id: int):
+        if chat_session_id in self._dirty:
+            await self._flush([chat_session_id])
+
+    async def flush_all(self):
+        await self._flush(list(self._dirty))
+
+    async def _flush(self, chat_session_ids: list):
+        if not chat_session_ids:
+            return
+
+        self._flush_lock = self._flush_lock or asyncio.Lock()
+        async with self._flush_lock:
+            for chat_session_id in chat_session_ids:
+                future = self._dirty.pop(chat_session_id, None)
+                entry = self._entries.get(chat_session_id)
+                if future is None or entry is None:
+                    continue
+
+                try:
+                    if not await self.save(entry[0]):
+                        # 文件已被其他行程刪除，捨棄快取避免重新建立
+                        print(f"Session {chat_session_id} no longer exists, dropping cached history")
+                        self._entries.pop(chat_session_id, None)
+                    if not future.done():
+                        future.set_result(None)
+                except Exception as e:
+                    print(f"Flush session {chat_session_id} failed, will retry: {str(e)}")
+                    if pending := self._dirty.get(chat_session_id):
+                        # 寫入期間又被標記為 dirty，讓舊的 future 跟隨新的一起完成
+                        self._chain(pending, future)
+                    else:
+                        self._dirty[chat_session_id] = future
+
+    @staticmethod
+    def _chain(source: asyncio.Future, target: asyncio.Future):
+        def propagate(done: asyncio.Future):
+            if target.done():
+                return
+            if done.cancelled():
+                target.cancel()
+            else:
+                target.set_result(None)
+        source.add_done_callback(propagate)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.flush_all()
+            except Exception as e:
+                print(f"Session cache flush error: {str(e)}")
+
+    async def close(self):
+        if self.flush_task and not self.flush_task.done():
+            self.flush_task.cancel()
+            try:
+                await self.flush_task
+            except asyncio.CancelledError:
+                pass
+        self.flush_task = None
+        await self.flush_all()
+        for future in self._dirty.values():
+            future.cancel()
+        self._dirty.clear()
+
+    def metrics(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "dirty": len(self._dirty),
+            "locked_sessions": len(self._session_locks)
+        }
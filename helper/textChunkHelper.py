@@ -0,0 +1,122 @@
+import os, re
+from typing import List, Optional, Tuple
+from helper.tokenCounterHelper import TokenCounterHelper, CJK_RANGES
+
+SENTENCE_BOUNDARY_PATTERN = re.compile(r"[。！？!?；;]+[」』”’\"')）]*|\.(?=\s)|\n+")
+UNIT_PATTERN = re.compile(f"[{CJK_RANGES}]|[^\\s{CJK_RANGES}]+\\s*|\\s+")
+# 嵌入時 tokenizer 會加上開頭與結尾的特殊 token (例如 <s> 與 </s>)
+SPECIAL_TOKENS = 2
+
+class TextChunkHelper:
+    """依 token 數切分文章，優先在句子邊界斷開，並保留字元位移"""
+
+    def __init__(self, token_counter: TokenCounterHelper, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None, max_seq_length: Optional[int] = None):
+        self.token_counter = token_counter
+        # 片段不可超過嵌入模型的 max_seq_length，否則尾端會被靜默截斷
+        self.max_seq_length = max_seq_length or int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "384"))
+        self.max_chunk_size = self.max_seq_length - SPECIAL_TOKENS
+        self.chunk_size = min(chunk_size or int(os.getenv("CHUNK_SIZE_TOKENS", "256")), self.max_chunk_size)
+        self.chunk_overlap = chunk_overlap if chunk_overlap is not None else int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+
+    @staticmethod
+    def _strip_span(text: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        return (start, end) if start < end else None
+
+    def split_sentences(self, text: str) -> List[Tuple[int, int]]:
+        spans = []
+        start = 0
+        for match in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+            if span := self._strip_span(text, start, match.end()):
+                spans.append(span)
+            start = match.end()
+        if span := self._strip_span(text, start, len(text)):
+            spans.append(span)
+        return spans
+
+    def _split_long_sentence(self, text: str, start: int, end: int, chunk_size: int) -> List[Tuple[int, int, int]]:
+        """句子超過視窗時，以單字 (英文) 或單字元 (中日韓) 為單位硬切"""
+        pieces = []
+        piece_start = start
+        piece_tokens = 0
+        for match in UNIT_PATTERN.finditer(text, start, end):
+            unit_tokens = self.token_counter.count(match.group(0).strip()) if match.group(0).strip() else 0
+            if unit_tokens > chunk_size:
+                if span := self._strip_span(text, piece_start, match.start()):
+                    pieces.append((*span, piece_tokens))
+                unit_start, unit_end = self._strip_span(text, match.start(), match.end())
+                pieces.extend(self._split_unit(text, unit_start, unit_end, chunk_size))
+                piece_start = match.end()
+                piece_tokens = 0
+                continue
+            if piece_tokens and piece_tokens + unit_tokens > chunk_size:
+                if span := self._strip_span(text, piece_start, match.start()):
+                    pieces.append((*span, piece_tokens))
+                piece_start = match.start()
+                piece_tokens = 0
+            piece_tokens += unit_tokens
+        if span := self._strip_span(text, piece_start, end):
+            pieces.append((*span, piece_tokens))
+        return pieces
+
+    def _split_unit(self, text: str, start: int, end: int, chunk_size: int) -> List[Tuple[int, int, int]]:
+        """無空白的超長單元 (網址、base64、程式碼) 以字元視窗硬切，每段重新計算 token 數確保不超過視窗"""
+        pieces = []
+        piece_start = start
+        while piece_start < end:
+            length = min(end - piece_start, chunk_size * 4)
+            tokens = self.token_counter.count(text[piece_start:piece_start + length])
+            while length > 1 and tokens > chunk_size:
+                length = max(1, min(length - 1, length * chunk_size // tokens))
+                tokens = self.token_counter.count(text[piece_start:piece_start + length])
+            pieces.append((piece_start, piece_start + length, tokens))
+            piece_start += length
+        return pieces
+
+    def chunk(self, text: str, chunk_size: Optional[int] = None, chunk_overlap: Optional[int] = None) -> List[dict]:
+        chunk_size = min(chunk_size or self.chunk_size, self.max_chunk_size)
+        chunk_overlap = min(chunk_overlap if chunk_overlap is not None else self.chunk_overlap, chunk_size // 2)
+
+        sentences = []
+        for start, end in self.split_sentences(text):
+            tokens = self.token_counter.count(text[start:end])
+            if tokens > chunk_size:
+                sentences.extend(self._split_long_sentence(text, start, end, chunk_size))
+            else:
+                sentences.append((start, end, tokens))
+
+        chunks = []
+        current: List[Tuple[int, int, int]] = []
+        current_tokens = 0
+
+        def emit():
+            chunk_start, chunk_end = current[0][0], current[-1][1]
+            chunks.append({
+                "text": text[chunk_start:chunk_end],
+                "start_offset": chunk_start,
+                "end_offset": chunk_end,
+                "token_count": current_tokens
+            })
+
+        for sentence in sentences:
+            if current and current_tokens + sentence[2] > chunk_size:
+                emit()
+                # 保留尾端句子作為重疊上下文
+                overlap: List[Tuple[int, int, int]] = []
+                overlap_tokens = 0
+                for previous in reversed(current):
+                    if overlap_tokens + previous[2] > chunk_overlap or overlap_tokens + previous[2] + sentence[2] > chunk_size:
+                        break
+                    overlap.insert(0, previous)
+                    overlap_tokens += previous[2]
+                current, current_tokens = overlap, overlap_tokens
+
+            current.append(sentence)
+            current_tokens += sentence[2]
+
+        if current:
+            emit()
+        return chunks
@@ -0,0 +1,56 @@
+import math, os, re
+from functools import lru_cache
+from typing import Optional
+
+CJK_RANGES = r"\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\u3040-\u30ff\uac00-\ud7af"
+CJK_CHAR_PATTERN = re.compile(f"[{CJK_RANGES}]")
+WORD_PATTERN = re.compile(r"[^\W_]+|[^\w\s]")
+
+class TokenCounterHelper:
+    """使用本地 tokenizer 計算 token 數，載入失敗時退回估算"""
+
+    def __init__(self, tokenizer_name: Optional[str] = None):
+        self.tokenizer_name = tokenizer_name or os.getenv("TOKENIZER_NAME") or os.getenv("MODEL_NAME")
+        self.CACHE_SIZE = int(os.getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))
+        self._tokenizer = None
+        # 歷史訊息每輪都會重新計算，以內容快取 token 數
+        self._count_tokens = lru_cache(maxsize=self.CACHE_SIZE)(self._encode_length)
+
+    def load(self, model=None):
+        """於啟動時在執行緒池中預載 tokenizer；與嵌入模型同名時直接複製其 tokenizer"""
+        if self._tokenizer is not None:
+            return
+        try:
+            from tokenizers import Tokenizer
+            backend = getattr(getattr(model, "tokenizer", None), "backend_tokenizer", None)
+            if backend is not None and self.tokenizer_name == os.getenv("MODEL_NAME"):
+                tokenizer = Tokenizer.from_str(backend.to_str())
+            else:
+                tokenizer = Tokenizer.from_pretrained(self.tokenizer_name)
+            tokenizer.no_truncation()
+            tokenizer.no_padding()
+            self._tokenizer = tokenizer
+            self._count_tokens.cache_clear()
+            print(f"tokenizer 載入完成: {self.tokenizer_name}")
+        except Exception as e:
+            print(f"載入 tokenizer 失敗，改用估算: {str(e)}")
+
+    @staticmethod
+    def estimate(text: str) -> int:
+        cjk_count = len(CJK_CHAR_PATTERN.findall(text))
+        other_text = CJK_CHAR_PATTERN.sub(" ", text)
+        word_count = len(WORD_PATTERN.findall(other_text))
+        return cjk_count + math.ceil(word_count * 1.3)
+
+    def _encode_length(self, text: str) -> int:
+        return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def count(self, text: str) -> int:
+        if not text:
+            return 0
+        # 未預載時退回估算，避免在事件迴圈中下載或載入 tokenizer
+        if self._tokenizer is None:
+            return self.estimate(text)
+        return self._count_tokens(text)
+
+token_counter = TokenCounterHelper()
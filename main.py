@@ -15,6 +15,7 @@ from core.mongodb_init import mongodb
 from core.llm_init import deepseek
 from models.dto.resultdto import ResultDTO
 from services.messaging.consumer import RabbitMQConsumer
+from services.dependencies import service_container
 
 logging.basicConfig(
     level=logging.INFO,
@@ -44,20 +45,27 @@ class AppState(dict):
 async def lifespan(app: FastAPI) -> AsyncGenerator[AppState, Any]:
     state = AppState()
     app.state = state 
+    consumer = None
     
     try:
         logger.info("Application starting up...")
         
         await mongodb.connect(app)
+        await mongodb.ensure_indexes()
         logger.info("MongoDB connected")
         deepseek.initialize()
         logger.info("LLM initialized")
+        await service_container.initialize()
+        logger.info("Services initialized")
         
-        logger.info("Starting RabbitMQ consumer thread...")
-        consumer = RabbitMQConsumer()
-        await consumer.initialize()
-        await consumer.connect()  
-        state.consumer_task = asyncio.create_task(consumer.start_consuming())
+        if os.getenv("RBMQ_CONSUMER_IN_APP", "true").lower() == "true":
+            logger.info("Starting RabbitMQ consumer thread...")
+            consumer = RabbitMQConsumer()
+            await consumer.initialize()
+            await consumer.connect()  
+            state.consumer_task = asyncio.create_task(consumer.start_consuming())
+        else:
+            logger.info("In-app RabbitMQ consumer disabled, run `python -m services.messaging.consumer` instead")
         
         yield dict(state)
         
@@ -69,7 +77,9 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[AppState, Any]:
                 await state.consumer_task
             except asyncio.CancelledError:
                 logger.info("Consumer task cancelled")
-        await consumer.graceful_shutdown()
+        if consumer:
+            await consumer.graceful_shutdown()
+        await service_container.close()
 
 # fast api setting 
 app = FastAPI(
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Union
+from typing import List, Literal, Optional, Union
 
 class BaseRequest(BaseModel):
     chat_session_id: int
@@ -11,4 +11,11 @@ class ChatRequest(BaseRequest) :
     message: str
     
 class SummaryRequest(BaseRequest):
-    pass
\ No newline at end of file
+    pass
+
+class ChatHistoryQuery(BaseModel):
+    before: Optional[int] = Field(default=None, ge=0)
+    after: Optional[int] = Field(default=None, ge=0)
+    limit: Optional[int] = Field(default=None, ge=1, le=500)
+    include_system: bool = True
+    fields: Optional[List[Literal["role", "content", "timestamp"]]] = None
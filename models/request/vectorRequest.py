@@ -1,8 +1,15 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import List, Literal, Optional
+
+# all-mpnet-base-v2 的 max_seq_length 為 384，扣除 2 個特殊 token
+MAX_CHUNK_TOKENS = 382
     
 class GenerateCollectionRequest(BaseModel):
     collection_name: str
+    hnsw_m: Optional[int] = Field(None, gt=0)
+    hnsw_ef_construct: Optional[int] = Field(None, gt=0)
+    on_disk: bool = False
+    quantization: Literal["none", "scalar", "binary"] = "none"
 
 class TextPoint(BaseModel):
     text: str
@@ -11,7 +18,14 @@ class TextPoint(BaseModel):
 class UpsertCollectionRequest(BaseModel):
     collection_name: str
     id: int
-    points: List[TextPoint]
+    points: List[TextPoint] = Field(..., min_length=1)
+    
+class IngestArticleRequest(BaseModel):
+    collection_name: str
+    id: int
+    text: str = Field(..., min_length=1)
+    chunk_size: Optional[int] = Field(None, gt=0, le=MAX_CHUNK_TOKENS)
+    chunk_overlap: Optional[int] = Field(None, ge=0)
     
 class VectorSearchRequest(BaseModel):
     collection_name: str
@@ -25,3 +39,17 @@ class CheckVectorDataExistRequest(BaseModel):
 class DeleteVectorDataRequest(BaseModel):
     collection_name: str
     id: int
+
+class VectorDataRef(BaseModel):
+    collection_name: str
+    id: int
+
+class BatchVectorDataRequest(BaseModel):
+    items: List[VectorDataRef] = Field(..., min_length=1)
+
+class EnsurePayloadIndexRequest(BaseModel):
+    collection_name: Optional[str] = None
+
+class MigratePointIdsRequest(BaseModel):
+    collection_name: str
+    batch_size: int = Field(256, gt=0, le=1000)
@@ -1,8 +1,16 @@
 from pydantic import BaseModel
+from typing import Optional
 
 class CollectionInfo(BaseModel):
     name: str
     
 class VectorSearchResult(BaseModel):
     text: str
-    score: float
\ No newline at end of file
+    score: float
+    
+class BatchVectorDataResult(BaseModel):
+    collection_name: str
+    id: int
+    success: bool
+    exists: Optional[bool] = None
+    message: Optional[str] = None
\ No newline at end of file
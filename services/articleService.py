@@ -36,7 +36,7 @@ class ArticleService:
                 ):
                     yield data_chunk
                 
-                yield "event: end\ndata: {}\n\n"
+                yield self.llm_stream_helper.END_EVENT
 
             except Exception as e:
                 error_msg = f"Stream generation failed: {str(e)}"
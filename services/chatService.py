@@ -1,12 +1,14 @@
 from helper.chatHistoryHelper import ChatHistoryHelper
 from helper.llmStreamHelper import LLMStreamHelper
 from helper.vectorHelper import VectorHelper
+from helper.conversationSummaryHelper import ConversationSummaryHelper
+from helper.tokenCounterHelper import token_counter
 from services.vectorService import VectorService
-from typing import Optional
+from typing import List, Optional
 
 from core.llm_init.prompt import PromptTemplates
 from models.dto.resultdto import ResultDTO
-from models.request.chatRequest import ChatRequest, SummaryRequest
+from models.request.chatRequest import ChatHistoryQuery, ChatRequest, SummaryRequest
 import asyncio
 
 class ChatService:
@@ -27,43 +29,57 @@ class ChatService:
         self.vector_helper.set_search_mode("hybrid")
         self.llm_stream_helper = LLMStreamHelper(
             temperature=self.temperature,
-            max_tokens=self.max_tokens
+            max_tokens=self.max_tokens,
+            prompt_templates=self.prompt_templates
+        )
+        self.summary_helper = ConversationSummaryHelper(
+            db=db,
+            prompt_templates=self.prompt_templates,
+            token_counter=token_counter
         )
 
-    async def get_chat_history_by_session_id(self, chat_session_id: int):
+    async def close(self):
+        await self.summary_helper.close()
+        await self.history_helper.close()
+
+    async def get_chat_history_by_session_id(self, chat_session_id: int, query: Optional[ChatHistoryQuery] = None):
         try:
-            chat_history = await self.db.histories.find_one({"chat_session_id": chat_session_id})
-            if not chat_history:
+            if query and query.before is not None and query.after is not None:
+                return ResultDTO.fail(code=400, message="before and after cannot be used together")
+
+            page = await self.history_helper.load_page(chat_session_id, query or ChatHistoryQuery())
+            if not page:
                 return ResultDTO.ok(data={
                     "response": [],
                     "chat_session_id": chat_session_id
                 })
 
-            return ResultDTO.ok(data={
-                "response": chat_history["messages"],
-                "chat_session_id": chat_history["chat_session_id"]
-            })
+            return ResultDTO.ok(data=page)
             
         except Exception as e:
             return ResultDTO.fail(code=500, message=str(e))
         
     async def delete_chat_history_by_session_id(self, chat_session_id: int):
         try:
-            chat_history = await self.db.histories.find_one({"chat_session_id": chat_session_id})
-            if not chat_history:
+            deleted_count = await self.history_helper.delete_many([chat_session_id])
+            if deleted_count == 0:
                 return ResultDTO.ok(
                     message=f"sessionId {chat_session_id} have not chat history"
                 )
-            else :
-                delete_result = await self.db.histories.delete_one({"_id": chat_history["_id"]})
-                if delete_result.deleted_count == 0:
-                    return ResultDTO.fail(
-                        code=500,
-                        message="Failed to delete chat history"
-                    )
-                return ResultDTO.ok(
-                    message=f"sessionId {chat_session_id} is delete"
-                )
+            return ResultDTO.ok(
+                message=f"sessionId {chat_session_id} is delete"
+            )
+            
+        except Exception as e:
+            return ResultDTO.fail(code=500, message=str(e))
+
+    async def delete_chat_histories_by_session_ids(self, chat_session_ids: List[int]):
+        try:
+            deleted_count = await self.history_helper.delete_many(chat_session_ids)
+            return ResultDTO.ok(
+                message=f"Deleted {deleted_count} chat histories",
+                data=deleted_count
+            )
             
         except Exception as e:
             return ResultDTO.fail(code=500, message=str(e))
@@ -81,7 +97,7 @@ class ChatService:
                     self.history_helper.append_message(chat_history, request.message, "user")
                 
                 if not request.collection_name:
-                    enhanced_messages = chat_history["messages"]
+                    enhanced_messages = self.llm_stream_helper.generate_history_messages(chat_history)
                 else:
                     # 使用混合搜尋
                     search_result = await self.vector_helper.hybrid_search_with_rerank(request)
@@ -99,7 +115,7 @@ class ChatService:
                     full_response += content
                     yield data_chunk
                 
-                yield "event: end\ndata: {}\n\n"
+                yield self.llm_stream_helper.END_EVENT
 
             except Exception as e:
                 error_msg = str(e)
@@ -107,7 +123,8 @@ class ChatService:
 
             finally:
                 if chat_history:
-                    await self.history_helper.finalize(chat_history, full_response)
+                    save_task = await self.history_helper.finalize(chat_history, full_response)
+                    self.summary_helper.schedule(chat_history, save_task)
 
         return self.llm_stream_helper.create_streaming_response(event_stream())
     
@@ -140,7 +157,7 @@ class ChatService:
                     full_response += content
                     yield data_chunk
                 
-                yield "event: end\ndata: {}\n\n"
+                yield self.llm_stream_helper.END_EVENT
 
             except Exception as e:
                 error_msg = str(e)
@@ -1,27 +1,86 @@
-from fastapi import Depends
+import asyncio
 from dependencies import get_db
 from services.vectorService import VectorService
+from core.embedding_init import embedding
+from helper.tokenCounterHelper import token_counter
 from services.articleService import ArticleService
 from services.englishAssistantService import EnglishAssistantService
+from services.messaging.sessionCacheInvalidator import SessionCacheInvalidator
+
+class ServiceContainer:
+    def __init__(self):
+        self.vector_service = None
+        self.chat_service = None
+        self.article_service = None
+        self.english_assistant_service = None
+        self.session_cache_invalidator = None
+
+    async def initialize(self):
+        """ build shared services once per worker """
+        from .chatService import ChatService
+
+        db = await get_db()
+        self.vector_service = VectorService()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(
+            self.vector_service.thread_pool,
+            self.vector_service._verify_embedding_dimension
+        )
+        await loop.run_in_executor(self.vector_service.thread_pool, token_counter.load, embedding.model)
+
+        self.chat_service = ChatService(db, self.vector_service)
+        self.chat_service.history_helper.archive_helper.start()
+        await self.start_session_cache_invalidator()
+        self.article_service = ArticleService()
+        self.english_assistant_service = EnglishAssistantService()
+        return self
+
+    async def start_session_cache_invalidator(self):
+        """ other workers and the standalone consumer delete sessions too; without the subscription the cache cannot stay correct """
+        history_helper = self.chat_service.history_helper
+        if not history_helper.session_cache:
+            return
+        invalidator = SessionCacheInvalidator(history_helper.session_cache)
+        try:
+            await invalidator.start()
+            self.session_cache_invalidator = invalidator
+        except Exception as e:
+            print(f"Session cache invalidation unavailable, disabling session cache: {str(e)}")
+            await invalidator.close()
+            history_helper.session_cache = None
+
+    async def initialize_consumer(self):
+        """ build only what the standalone consumer needs: Qdrant and MongoDB deletes, no embedding model or background jobs """
+        from .chatService import ChatService
+
+        db = await get_db()
+        self.vector_service = VectorService()
+        self.chat_service = ChatService(db, self.vector_service)
+        self.article_service = ArticleService()
+        return self
+
+    async def close(self):
+        if self.session_cache_invalidator:
+            await self.session_cache_invalidator.close()
+        if self.chat_service:
+            await self.chat_service.close()
+        if self.vector_service:
+            await self.vector_service.close()
+
+service_container = ServiceContainer()
 
 def get_vector_service():
-    return VectorService()
+    return service_container.vector_service
 
 def get_article_service():
-    return ArticleService()
+    return service_container.article_service
 
 def get_english_assistant_service():
-    return EnglishAssistantService()
+    return service_container.english_assistant_service
 
-def get_chat_service(
-    db = Depends(get_db),
-    vector_service: VectorService = Depends(get_vector_service)
-):
-    from .chatService import ChatService 
-    return ChatService(db, vector_service)
+def get_chat_service():
+    return service_container.chat_service
 
 async def get_chat_service_async():
-    db = await get_db()  
-    vector_service = VectorService()
-    from .chatService import ChatService
-    return ChatService(db, vector_service)
\ No newline at end of file
+    return service_container.chat_service
@@ -37,7 +37,7 @@ class EnglishAssistantService:
                 ):
                     yield data_chunk
                 
-                yield "event: end\ndata: {}\n\n"
+                yield self.llm_stream_helper.END_EVENT
 
             except Exception as e:
                 error_msg = str(e)
@@ -62,7 +62,7 @@ class EnglishAssistantService:
                 ):
                     yield data_chunk
                 
-                yield "event: end\ndata: {}\n\n"
+                yield self.llm_stream_helper.END_EVENT
 
             except Exception as e:
                 error_msg = str(e)
@@ -87,7 +87,7 @@ class EnglishAssistantService:
                 ):
                     yield data_chunk
                 
-                yield "event: end\ndata: {}\n\n"
+                yield self.llm_stream_helper.END_EVENT
 
             except Exception as e:
                 error_msg = str(e)
@@ -1,9 +1,8 @@
-import os, json, asyncio, aio_pika
-from typing import Optional
-from tenacity import stop_after_attempt, wait_exponential, retry_if_exception_type, AsyncRetrying
+import os, json, signal, asyncio, aio_pika
+from typing import Dict, List, Optional
 from functools import partial
 
-from models.request.vectorRequest import DeleteVectorDataRequest
+from models.request.vectorRequest import BatchVectorDataRequest, VectorDataRef
 from services.chatService import ChatService
 from services.vectorService import VectorService
 from services.articleService import ArticleService
@@ -16,24 +15,39 @@ class RabbitMQConsumer:
         self.article_service: Optional[ArticleService] = None
         self.connection = None
         self.channel = None
+        self._consumer_channels: List[aio_pika.abc.AbstractChannel] = []
+        self._worker_tasks: List[asyncio.Task] = []
         self._shutdown_flag = asyncio.Event()
+        self.RETRY_HEADER = "x-retry-count"
+        self.RETRY_DELAYS_MS = [int(delay) for delay in os.getenv("RBMQ_RETRY_DELAYS_MS", "2000,10000,60000").split(",") if delay.strip()]
         self._event_configs = {
             "ChatSessionDeleted": {
                 "exchange_name": "chat_events",
                 "routing_key": "chat.deleted",
                 "queue_name": "chat_deleted_queue",
                 "dl_exchange": "chat_dlx",
-                "dl_routing_key": "chat.dead"
+                "dl_routing_key": "chat.dead",
+                **self.load_batch_settings("RBMQ_CHAT_DELETED", batch_size=50, prefetch=100)
             },
             "ArticleDeleted": {
                 "exchange_name": "article_events",
                 "routing_key": "article.deleted",
                 "queue_name": "article_deleted_queue",
                 "dl_exchange": "article_dlx",
-                "dl_routing_key": "article.dead"
+                "dl_routing_key": "article.dead",
+                **self.load_batch_settings("RBMQ_ARTICLE_DELETED", batch_size=100, prefetch=200)
             }
         }
 
+    @staticmethod
+    def load_batch_settings(env_prefix: str, batch_size: int, prefetch: int) -> dict:
+        return {
+            "batch_size": int(os.getenv(f"{env_prefix}_BATCH_SIZE", str(batch_size))),
+            "batch_wait_ms": float(os.getenv(f"{env_prefix}_BATCH_WAIT_MS", "50")),
+            "prefetch": int(os.getenv(f"{env_prefix}_PREFETCH", str(prefetch))),
+            "concurrency": int(os.getenv(f"{env_prefix}_CONCURRENCY", "2"))
+        }
+
     async def initialize(self):
         self.chat_service = await get_chat_service_async() 
         self.vector_service = get_vector_service() 
@@ -48,7 +62,6 @@ class RabbitMQConsumer:
                 timeout=10  
             )
             self.channel = await self.connection.channel()
-            await self.channel.set_qos(prefetch_count=10)
             await self.declare_infrastructure()
         except Exception as e:
             print(f"Connection failed: {str(e)}")
@@ -82,6 +95,20 @@ class RabbitMQConsumer:
                 await queue.bind(config["exchange_name"], config["routing_key"])
                 print(f"Bound queue {config['queue_name']} to {config['exchange_name']}")
 
+                # 延遲重試佇列：訊息 TTL 到期後經由預設 exchange 只回到本服務的主佇列
+                # 佇列名稱包含延遲時間，調整 RBMQ_RETRY_DELAYS_MS 時會宣告新佇列而非與既有參數衝突
+                for delay in self.RETRY_DELAYS_MS:
+                    await self.channel.declare_queue(
+                        name=self.retry_queue_name(config, delay),
+                        durable=True,
+                        arguments={
+                            "x-message-ttl": delay,
+                            "x-dead-letter-exchange": "",
+                            "x-dead-letter-routing-key": config["queue_name"]
+                        }
+                    )
+                print(f"Declared {len(self.RETRY_DELAYS_MS)} retry queues for {config['queue_name']}")
+
                 dlx_queue = await self.channel.declare_queue(
                     name=f"{config['dl_exchange']}_queue",
                     durable=True
@@ -93,96 +120,197 @@ class RabbitMQConsumer:
             await self.safe_close()
             raise
 
+    @staticmethod
+    def retry_queue_name(config: dict, delay_ms: int) -> str:
+        return f"{config['queue_name']}_retry_{delay_ms}ms"
+
     async def start_consuming(self):
         try:
             for config_name, config in self._event_configs.items():
-                queue = await self.channel.get_queue(config["queue_name"])
-                callback = partial(self.on_message, config_name=config_name, queue_name=config["queue_name"])
-                await queue.consume(callback)
-                print(f"Listening to queue: {config['queue_name']}")
+                # 每個佇列使用獨立 channel，讓 prefetch 依佇列設定
+                channel = await self.connection.channel()
+                await channel.set_qos(prefetch_count=config["prefetch"])
+                self._consumer_channels.append(channel)
+
+                buffer: asyncio.Queue = asyncio.Queue()
+                queue = await channel.get_queue(config["queue_name"])
+                await queue.consume(partial(self.on_message, buffer=buffer))
+
+                for _ in range(config["concurrency"]):
+                    self._worker_tasks.append(asyncio.create_task(
+                        self.batch_worker(config_name, config, buffer)
+                    ))
+                print(f"Listening to queue: {config['queue_name']} "
+                      f"(batch={config['batch_size']}, prefetch={config['prefetch']}, workers={config['concurrency']})")
             
             await self._shutdown_flag.wait()
         except Exception as e:
             print(f"Consuming failed: {str(e)}")
             await self.safe_close()
+        finally:
+            for task in self._worker_tasks:
+                task.cancel()
+            await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+            self._worker_tasks.clear()
+
+    async def on_message(self, message: aio_pika.abc.AbstractIncomingMessage, buffer: asyncio.Queue):
+        await buffer.put(message)
 
-    async def on_message(self, message: aio_pika.IncomingMessage, config_name: str, queue_name: str):
-        async with message.process(requeue=False):  
+    async def collect_batch(self, buffer: asyncio.Queue, batch_size: int, batch_wait_ms: float) -> List[aio_pika.abc.AbstractIncomingMessage]:
+        batch = [await buffer.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + batch_wait_ms / 1000
+        while len(batch) < batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
             try:
-                config = self._event_configs.get(config_name)
-                if not config:
-                    print(f"Config {config_name} not found for queue: {queue_name}")
-                    raise ValueError(f"Config {config_name} not found")
+                batch.append(await asyncio.wait_for(buffer.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
 
+    async def batch_worker(self, config_name: str, config: dict, buffer: asyncio.Queue):
+        while True:
+            batch = await self.collect_batch(buffer, config["batch_size"], config["batch_wait_ms"])
+            try:
                 if config_name == "ChatSessionDeleted":
-                    await self.handle_chat_deletion(message)
+                    results = await self.handle_chat_deletion_batch(batch)
                 elif config_name == "ArticleDeleted":
-                    await self.handle_article_deletion(message)
+                    results = await self.handle_article_deletion_batch(batch)
                 else:
                     print(f"Unhandled event type: {config_name}")
-                    raise ValueError(f"Unhandled event type: {config_name}")
-
+                    results = [None] * len(batch)
             except Exception as e:
                 print(f"Message processing error: {str(e)}")
-    
-    async def handle_article_deletion(self, message: aio_pika.IncomingMessage):
+                results = [False] * len(batch)
+
+            await self.settle(config, batch, results)
+
+    async def settle(self, config: dict, batch: List[aio_pika.abc.AbstractIncomingMessage], results: List[Optional[bool]]):
+        """True 表示成功、False 表示可重試、None 表示無效訊息直接送往 DLX"""
+        for message, success in zip(batch, results):
+            try:
+                if success:
+                    await message.ack()
+                elif success is None or not await self.schedule_retry(config, message):
+                    await message.nack(requeue=False)
+            except Exception as e:
+                print(f"Settle message failed: {str(e)}")
+
+    async def schedule_retry(self, config: dict, message: aio_pika.abc.AbstractIncomingMessage) -> bool:
+        attempt = int((message.headers or {}).get(self.RETRY_HEADER, 0)) + 1
+        if attempt > len(self.RETRY_DELAYS_MS):
+            print(f"Retries exhausted for {config['queue_name']}, dead-lettering message")
+            return False
+
+        try:
+            await self.channel.default_exchange.publish(
+                aio_pika.Message(
+                    body=message.body,
+                    headers={**(message.headers or {}), self.RETRY_HEADER: attempt},
+                    content_type=message.content_type,
+                    message_id=message.message_id,
+                    delivery_mode=aio_pika.DeliveryMode.PERSISTENT
+                ),
+                routing_key=self.retry_queue_name(config, self.RETRY_DELAYS_MS[attempt - 1])
+            )
+        except Exception as e:
+            print(f"Publish retry failed, dead-lettering message: {str(e)}")
+            return False
+
+        await message.ack()
+        print(f"Scheduled retry {attempt} for {config['queue_name']} in {self.RETRY_DELAYS_MS[attempt - 1]} ms")
+        return True
+
+    @staticmethod
+    def parse_article_event(message: aio_pika.abc.AbstractIncomingMessage) -> tuple:
         data = json.loads(message.body.decode())
         article_id = data.get("ArticleId")
         collection_name =  data.get("CollectionName")
         
         if not article_id :
-            print("Missing article_id  in message")
             raise ValueError("Missing article_id  in message")
         
         if not collection_name :
-            print("Missing collection_name in message")
             raise ValueError("Missing collection_name in message")
         
         try:
             article_id = int(article_id)
         except (ValueError, TypeError):
             raise ValueError("ArticleID must be an integer")
+        return collection_name, article_id
 
-        async for attempt in AsyncRetrying(
-            stop=stop_after_attempt(3),
-            wait=wait_exponential(multiplier=1, min=2, max=10),
-            retry=retry_if_exception_type(Exception)
-        ):
-            with attempt:
-                delete_vector_request = DeleteVectorDataRequest(
-                    collection_name=collection_name,
-                    id=article_id
-                )
-                print(f"Processing article deletion: {delete_vector_request}")
-                
-                result = await self.vector_service.delete_vector_data(delete_vector_request)
-                
-                if not result.success:
-                    raise RuntimeError(result.message)
-                
-                print(f"Successfully processed article deletion: {article_id}")
-                
-    async def handle_chat_deletion(self, message: aio_pika.IncomingMessage):
+    @staticmethod
+    def parse_chat_event(message: aio_pika.abc.AbstractIncomingMessage):
         data = json.loads(message.body.decode())
         session_id = data.get("SessionId")
         
         if not session_id:
-            print("Missing session_id in message")
             raise ValueError("Missing session_id in message")
+        return session_id
+
+    @staticmethod
+    def parse_batch(batch: List[aio_pika.abc.AbstractIncomingMessage], parser) -> Dict[int, object]:
+        """解析失敗的訊息不列入結果，其索引在批次結果中維持 None"""
+        parsed = {}
+        for index, message in enumerate(batch):
+            try:
+                parsed[index] = parser(message)
+            except Exception as e:
+                print(f"Invalid message skipped: {str(e)}")
+        return parsed
+
+    @staticmethod
+    def mark_parsed(results: List[Optional[bool]], parsed: Dict[int, object], success: bool) -> List[Optional[bool]]:
+        for index in parsed:
+            results[index] = success
+        return results
+
+    async def handle_article_deletion_batch(self, batch: List[aio_pika.abc.AbstractIncomingMessage]) -> List[Optional[bool]]:
+        parsed = self.parse_batch(batch, self.parse_article_event)
+        results: List[Optional[bool]] = [None] * len(batch)
+        if not parsed:
+            return results
 
-        async for attempt in AsyncRetrying(
-            stop=stop_after_attempt(3),
-            wait=wait_exponential(multiplier=1, min=2, max=10),
-            retry=retry_if_exception_type(Exception)
-        ):
-            with attempt:
-                result = await self.chat_service.delete_chat_history_by_session_id(session_id)
-                if not result.success:
-                    raise RuntimeError(result.message)
-                print(f"Deleted chat session: {session_id}")
+        delete_vector_request = BatchVectorDataRequest(
+            items=[VectorDataRef(collection_name=collection_name, id=article_id) for collection_name, article_id in parsed.values()]
+        )
+        print(f"Processing article deletion batch: {len(parsed)} messages")
+
+        result = await self.vector_service.batch_delete_vector_data(delete_vector_request)
+        if not result.success:
+            print(f"Article deletion batch failed: {result.message}")
+            return self.mark_parsed(results, parsed, False)
+
+        succeeded = {(item.collection_name, item.id) for item in result.data if item.success}
+        for index, key in parsed.items():
+            results[index] = key in succeeded
+        print(f"Successfully processed article deletion batch: {sum(1 for success in results if success)}/{len(batch)}")
+        return results
+                
+    async def handle_chat_deletion_batch(self, batch: List[aio_pika.abc.AbstractIncomingMessage]) -> List[Optional[bool]]:
+        parsed = self.parse_batch(batch, self.parse_chat_event)
+        results: List[Optional[bool]] = [None] * len(batch)
+        if not parsed:
+            return results
+
+        session_ids = list(dict.fromkeys(parsed.values()))
+        result = await self.chat_service.delete_chat_histories_by_session_ids(session_ids)
+        if not result.success:
+            print(f"Chat deletion batch failed: {result.message}")
+            return self.mark_parsed(results, parsed, False)
+
+        self.mark_parsed(results, parsed, True)
+        print(f"Deleted chat sessions: {session_ids}")
+        return results
 
     async def safe_close(self):
         try:
+            for channel in self._consumer_channels:
+                if not channel.is_closed:
+                    await channel.close()
+            self._consumer_channels.clear()
             if self.channel and not self.channel.is_closed:
                 await self.channel.close()
             if self.connection and not self.connection.is_closed:
@@ -193,4 +321,32 @@ class RabbitMQConsumer:
 
     async def graceful_shutdown(self):
         self._shutdown_flag.set()
-        print("Shutting down consumer...")
\ No newline at end of file
+        print("Shutting down consumer...")
+
+async def run_standalone():
+    """ 獨立的消費者行程，與 HTTP worker 分開擴展 """
+    from dotenv import load_dotenv
+    from core.mongodb_init import mongodb
+    from services.dependencies import service_container
+
+    load_dotenv()
+    await mongodb.connect()
+    # 只需刪除資料：不載入嵌入模型、LLM 與封存等背景工作，索引由 HTTP worker 建立
+    await service_container.initialize_consumer()
+
+    consumer = RabbitMQConsumer()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, lambda: asyncio.create_task(consumer.graceful_shutdown()))
+
+    try:
+        await consumer.initialize()
+        await consumer.connect()
+        await consumer.start_consuming()
+    finally:
+        await consumer.safe_close()
+        await service_container.close()
+        await mongodb.close()
+
+if __name__ == "__main__":
+    asyncio.run(run_standalone())
@@ -0,0 +1,44 @@
+import os, json, aio_pika
+from typing import Optional
+from helper.sessionCacheHelper import SessionCacheHelper
+
+class SessionCacheInvalidator:
+    """每個 worker 以獨佔佇列訂閱 ChatSessionDeleted，清除本機快取中的對話"""
+
+    def __init__(self, session_cache: SessionCacheHelper):
+        self.session_cache = session_cache
+        self.EXCHANGE_NAME = "chat_events"
+        self.ROUTING_KEY = "chat.deleted"
+        self.connection: Optional[aio_pika.abc.AbstractRobustConnection] = None
+
+    async def start(self):
+        self.connection = await aio_pika.connect_robust(
+            host=os.getenv("RBMQ_HOSTNAME"),
+            login=os.getenv("RBMQ_USERNAME"),
+            password=os.getenv("RBMQ_PASSWORD"),
+            timeout=10
+        )
+        channel = await self.connection.channel()
+        exchange = await channel.declare_exchange(
+            name=self.EXCHANGE_NAME,
+            type=aio_pika.ExchangeType.DIRECT,
+            durable=True
+        )
+        # 伺服器命名的獨佔佇列：每個 worker 各收到一份，連線中斷時自動刪除
+        queue = await channel.declare_queue(exclusive=True, auto_delete=True)
+        await queue.bind(exchange, self.ROUTING_KEY)
+        await queue.consume(self.on_message, no_ack=True)
+        print(f"Session cache invalidation bound to {self.EXCHANGE_NAME}/{self.ROUTING_KEY}")
+
+    async def on_message(self, message: aio_pika.abc.AbstractIncomingMessage):
+        try:
+            session_id = int(json.loads(message.body.decode())["SessionId"])
+        except Exception as e:
+            print(f"Invalid session invalidation message skipped: {str(e)}")
+            return
+        self.session_cache.invalidate([session_id])
+
+    async def close(self):
+        if self.connection and not self.connection.is_closed:
+            await self.connection.close()
+        self.connection = None
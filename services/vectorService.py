@@ -1,29 +1,52 @@
 from models.dto.resultdto import ResultDTO
-from models.response.vectorResponse import CollectionInfo, VectorSearchResult
-from models.request.vectorRequest import CheckVectorDataExistRequest, DeleteVectorDataRequest, GenerateCollectionRequest, UpsertCollectionRequest
+from models.response.vectorResponse import BatchVectorDataResult, CollectionInfo, VectorSearchResult
+from models.request.vectorRequest import BatchVectorDataRequest, CheckVectorDataExistRequest, DeleteVectorDataRequest, EnsurePayloadIndexRequest, GenerateCollectionRequest, IngestArticleRequest, MigratePointIdsRequest, UpsertCollectionRequest
 from core.qdrant_client_init import qdrant_client
 from core.embedding_init import embedding
+from core.embedding_init.batcher import EmbeddingBatcher
+from core.embedding_init.cache import EmbeddingCache
 
-import asyncio, os, hashlib
+import asyncio, os, hashlib, uuid
+from functools import cached_property
 from qdrant_client.http import models
 from concurrent.futures import ThreadPoolExecutor
-from qdrant_client.models import PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue
-from typing import List, Dict, Optional
+from qdrant_client.models import PointStruct, VectorParams, Distance, Filter, FieldCondition, MatchValue, MatchAny, PayloadSchemaType, TextIndexParams, TextIndexType, TokenizerType
+from qdrant_client.models import SparseVectorParams, Modifier
+from qdrant_client.models import HnswConfigDiff, ScalarQuantization, ScalarQuantizationConfig, ScalarType, BinaryQuantization, BinaryQuantizationConfig, SearchParams, QuantizationSearchParams
+from typing import AsyncIterator, List, Dict, Optional, Union
 from qdrant_client.http import models as qdrant_models
 from helper.hybridSearchHelper import HybridSearchHelper
+from helper.collectionRegistryHelper import CollectionRegistryHelper, is_not_found_error
+from helper.bm25Helper import Bm25Helper
+from helper.bulkUpsertHelper import BulkUpsertHelper
+from helper.textChunkHelper import TextChunkHelper
+from helper.tokenCounterHelper import token_counter
 
+POINT_ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "py_chat_service/vector_points")
 max_workers = min(32, (os.cpu_count() or 4) + 4) 
 embedding_executor = ThreadPoolExecutor(max_workers=max_workers)
 
 class VectorService:
     def __init__(self):
         self.thread_pool = embedding_executor 
+        self.embedding_batcher = EmbeddingBatcher(embedding, self.thread_pool)
+        self.embedding_cache = EmbeddingCache()
         self.hybrid_helper = HybridSearchHelper(self)
+        self.collection_registry = CollectionRegistryHelper()
+        self.bm25_helper = Bm25Helper()
+        self.bulk_upsert_helper = BulkUpsertHelper(self)
         self.HARDCODE_LIMIT = 10
         self.HARDCODE_MIN_SCORE = 0.1
         self.VECTOR_DIM = 768
-        self._verify_embedding_dimension()
+        self.TEXT_TOKENIZER = os.getenv("QDRANT_TEXT_TOKENIZER", "multilingual")
+        self.SEARCH_HNSW_EF = int(os.getenv("QDRANT_SEARCH_HNSW_EF", "128"))
+        self.QUANTIZATION_OVERSAMPLING = float(os.getenv("QDRANT_QUANTIZATION_OVERSAMPLING", "2.0"))
         
+    @cached_property
+    def text_chunk_helper(self) -> TextChunkHelper:
+        # 延後到首次切分時才讀取模型的 max_seq_length，避免建構時載入模型
+        return TextChunkHelper(token_counter, max_seq_length=getattr(embedding.model, "max_seq_length", None))
+
     def _verify_embedding_dimension(self):
         test_text = "dimension test"
         test_vector = embedding.model.encode([test_text]).tolist()[0]
@@ -37,9 +60,16 @@ class VectorService:
             print(f"嵌入模型維度驗證通過: {actual_dim}維")
     
     async def close(self):
+        await self.embedding_batcher.close()
         print("關閉線程池...")
         self.thread_pool.shutdown(wait=True) 
 
+    def get_embedding_metrics(self) -> ResultDTO[dict]:
+        return ResultDTO.ok(data={
+            "batcher": self.embedding_batcher.metrics(),
+            "cache": self.embedding_cache.metrics()
+        })
+
     async def get_all_collections(self) -> ResultDTO[List[CollectionInfo]]:
         try:
             response = await qdrant_client.client.get_collections() 
@@ -53,9 +83,8 @@ class VectorService:
 
     async def delete_vector_data(self, request: DeleteVectorDataRequest) -> ResultDTO:
         try:
-            if not await qdrant_client.client.collection_exists(request.collection_name):
-                print(f"集合不存在: {request.collection_name}")
-                return ResultDTO.fail(code=404, message="Collection not found")
+            if error := await self.check_collection_exists(request.collection_name):
+                return error
 
             filter_condition = models.Filter(
                 must=[
@@ -75,14 +104,15 @@ class VectorService:
             print(f"已刪除向量資料 ID {request.id} 從集合 '{request.collection_name}'")
             return ResultDTO.ok(message=f"Deleted vector data ID {request.id}")
         except Exception as e:
+            if error := self.handle_collection_not_found(request.collection_name, e):
+                return error
             print(f"刪除失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=f"Deletion failed: {str(e)}")
         
     async def check_vector_data_exist(self, request: CheckVectorDataExistRequest) -> ResultDTO[bool]:
         try:
-            if not await qdrant_client.client.collection_exists(request.collection_name):
-                print(f"集合不存在: {request.collection_name}")
-                return ResultDTO.fail(code=404, message="Collection not found")
+            if error := await self.check_collection_exists(request.collection_name):
+                return error
         
             filter_condition = models.Filter(
                 must=[
@@ -103,74 +133,431 @@ class VectorService:
             print(f"檢查結果: 存在={exists}")
             return ResultDTO.ok(data=exists)
         except Exception as e:
+            if error := self.handle_collection_not_found(request.collection_name, e):
+                return error
             print(f"檢查失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=str(e))
      
-    def generate_base_id(self, id: int) -> int:
+    @staticmethod
+    def group_ids_by_collection(request: BatchVectorDataRequest) -> Dict[str, List[int]]:
+        # dict 去重並保留首次出現的順序
+        grouped: Dict[str, Dict[int, None]] = {}
+        for item in request.items:
+            grouped.setdefault(item.collection_name, {})[item.id] = None
+        return {collection_name: list(ids) for collection_name, ids in grouped.items()}
+
+    def build_ids_filter(self, ids: List[int]) -> Filter:
+        return Filter(
+            must=[
+                FieldCondition(
+                    key="id",
+                    match=MatchAny(any=ids)
+                )
+            ]
+        )
+
+    async def _delete_collection_ids(self, collection_name: str, ids: List[int]) -> List[BatchVectorDataResult]:
         try:
-            return int(id)
-        except ValueError:
-            print(f"ID非整數，進行雜湊: {id}")
-            hash_obj = hashlib.sha256(str(id).encode())
-            hashed = int(hash_obj.hexdigest()[:8], 16)
-            print(f"雜湊後ID: {id} -> {hashed}")
-            return hashed
+            if error := await self.check_collection_exists(collection_name):
+                return [BatchVectorDataResult(collection_name=collection_name, id=id, success=False, message=error.message) for id in ids]
+            
+            await qdrant_client.client.delete(
+                collection_name=collection_name,
+                points_selector=qdrant_models.FilterSelector(
+                    filter=self.build_ids_filter(ids)
+                )
+            )
+            print(f"已批次刪除 {len(ids)} 個 ID 從集合 '{collection_name}'")
+            return [BatchVectorDataResult(collection_name=collection_name, id=id, success=True) for id in ids]
+        except Exception as e:
+            message = (self.handle_collection_not_found(collection_name, e) or ResultDTO.fail(code=500, message=str(e))).message
+            print(f"批次刪除失敗: {message}")
+            return [BatchVectorDataResult(collection_name=collection_name, id=id, success=False, message=message) for id in ids]
+
+    async def _count_collection_ids(self, collection_name: str, ids: List[int]) -> Dict[int, int]:
+        collection_meta = await self.collection_registry.get(collection_name)
+        if collection_meta and "id" in collection_meta["indexed_fields"]:
+            response = await qdrant_client.client.facet(
+                collection_name=collection_name,
+                key="id",
+                facet_filter=self.build_ids_filter(ids),
+                limit=len(ids),
+                exact=True
+            )
+            return {hit.value: hit.count for hit in response.hits}
+
+        # 未建立 id 索引的舊集合無法 facet，改為單次 MatchAny scroll 只取 id 欄位計數
+        print(f"集合 {collection_name} 缺少 id 索引，改用 scroll 計數")
+        counts: Dict[int, int] = {}
+        next_offset = None
+        while True:
+            records, next_offset = await qdrant_client.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=self.build_ids_filter(ids),
+                limit=1000,
+                offset=next_offset,
+                with_payload=["id"],
+                with_vectors=False
+            )
+            for record in records:
+                id = record.payload.get("id")
+                counts[id] = counts.get(id, 0) + 1
+            if next_offset is None:
+                break
+        return counts
+
+    async def _check_collection_ids(self, collection_name: str, ids: List[int]) -> List[BatchVectorDataResult]:
+        try:
+            if error := await self.check_collection_exists(collection_name):
+                return [BatchVectorDataResult(collection_name=collection_name, id=id, success=False, message=error.message) for id in ids]
+            
+            counts = await self._count_collection_ids(collection_name, ids)
+            return [
+                BatchVectorDataResult(collection_name=collection_name, id=id, success=True, exists=counts.get(id, 0) > 0)
+                for id in ids
+            ]
+        except Exception as e:
+            message = (self.handle_collection_not_found(collection_name, e) or ResultDTO.fail(code=500, message=str(e))).message
+            print(f"批次檢查失敗: {message}")
+            return [BatchVectorDataResult(collection_name=collection_name, id=id, success=False, message=message) for id in ids]
+
+    async def batch_delete_vector_data(self, request: BatchVectorDataRequest) -> ResultDTO[List[BatchVectorDataResult]]:
+        grouped = self.group_ids_by_collection(request)
+        results = await asyncio.gather(*(
+            self._delete_collection_ids(collection_name, ids)
+            for collection_name, ids in grouped.items()
+        ))
+        return ResultDTO.ok(data=[item for group in results for item in group])
+
+    async def batch_check_vector_data_exist(self, request: BatchVectorDataRequest) -> ResultDTO[List[BatchVectorDataResult]]:
+        grouped = self.group_ids_by_collection(request)
+        results = await asyncio.gather(*(
+            self._check_collection_ids(collection_name, ids)
+            for collection_name, ids in grouped.items()
+        ))
+        return ResultDTO.ok(data=[item for group in results for item in group])
+     
+    def build_point_vector(self, collection_meta: Optional[dict], vector: List[float], text: str):
+        if collection_meta and Bm25Helper.VECTOR_NAME in collection_meta["sparse_vectors"]:
+            return {
+                "": vector,
+                Bm25Helper.VECTOR_NAME: self.bm25_helper.encode_document(text)
+            }
+        return vector
+     
+    def build_points(
+        self,
+        collection_name: str,
+        collection_meta: Optional[dict],
+        id: int,
+        texts: List[str],
+        vectors: List[List[float]],
+        start_index: int = 0,
+        payloads: Optional[List[dict]] = None,
+        indices: Optional[List[int]] = None
+    ) -> List[PointStruct]:
+        payloads = payloads or [{} for _ in texts]
+        indices = indices or range(start_index, start_index + len(texts))
+        return [
+            PointStruct(
+                id=self.generate_point_id(collection_name, id, idx),
+                vector=self.build_point_vector(collection_meta, vector, text),
+                payload={
+                    **extra_payload,
+                    "text": text,
+                    "id": id,
+                    "point_index": idx,
+                    "content_hash": self.content_hash(text)
+                }
+            )
+            for idx, text, vector, extra_payload in zip(indices, texts, vectors, payloads)
+        ]
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    async def get_existing_chunk_hashes(self, collection_name: str, id: int) -> Dict[str, List[tuple]]:
+        """以單次 scroll (不含向量) 取得文章現有片段: content_hash -> [(point id, point_index)]，舊 ID 與 UUID 可能並存"""
+        existing = {}
+        next_offset = None
+        while True:
+            records, next_offset = await qdrant_client.client.scroll(
+                collection_name=collection_name,
+                scroll_filter=self.build_search_filter(id),
+                limit=1000,
+                offset=next_offset,
+                with_payload=["point_index", "content_hash"],
+                with_vectors=False
+            )
+            for record in records:
+                existing.setdefault(record.payload.get("content_hash"), []).append(
+                    (record.id, record.payload.get("point_index"))
+                )
+            if next_offset is None:
+                break
+        return existing
+
+    async def get_dense_vectors(self, collection_name: str, point_ids: List[Union[int, str]]) -> Dict[Union[int, str], tuple]:
+        """取回既有點的 (content_hash, 稠密向量)，供位移後的片段重新寫入而不需重新嵌入"""
+        if not point_ids:
+            return {}
+        records = await qdrant_client.client.retrieve(
+            collection_name=collection_name,
+            ids=point_ids,
+            with_payload=["content_hash"],
+            with_vectors=True
+        )
+        return {
+            record.id: (
+                (record.payload or {}).get("content_hash"),
+                record.vector.get("") if isinstance(record.vector, dict) else record.vector
+            )
+            for record in records if record.vector
+        }
+
+    async def prepare_chunk_points(
+        self,
+        collection_name: str,
+        collection_meta: Optional[dict],
+        id: int,
+        texts: List[str],
+        existing: Dict[str, List[tuple]],
+        start_index: int = 0,
+        payloads: Optional[List[dict]] = None
+    ) -> dict:
+        """以內容雜湊比對 start_index 起的連續片段，不依賴位置：同位置同內容視為未變更，其他位置已有相同內容則沿用其向量"""
+        payloads = payloads or [{} for _ in texts]
+        hashes = {start_index + offset: self.content_hash(text) for offset, text in enumerate(texts)}
+        unchanged = []
+        moved = {}
+        changed = []
+        for idx, text_hash in hashes.items():
+            candidates = existing.get(text_hash, [])
+            if any(point_id == self.generate_point_id(collection_name, id, idx) for point_id, _ in candidates):
+                unchanged.append(idx)
+            elif candidates:
+                moved[idx] = candidates[0][0]
+            else:
+                changed.append(idx)
+        
+        # 來源點可能已被先前批次覆寫，僅在內容雜湊仍相符時沿用向量
+        reused = await self.get_dense_vectors(collection_name, list(dict.fromkeys(moved.values())))
+        vectors_by_index = {
+            idx: reused[point_id][1] for idx, point_id in moved.items()
+            if point_id in reused and reused[point_id][0] == hashes[idx]
+        }
+        changed.extend(idx for idx in moved if idx not in vectors_by_index)
+        
+        if changed:
+            print("產生嵌入向量...")
+            vectors = await self.encode_texts([texts[idx - start_index] for idx in changed])
+            if vectors and len(vectors[0]) != self.VECTOR_DIM:
+                print(f"向量維度錯誤! 實際={len(vectors[0])}, 預期={self.VECTOR_DIM}")
+                raise ValueError("Vector dimension mismatch")
+            vectors_by_index.update(zip(changed, vectors))
+        
+        written = sorted(vectors_by_index)
+        return {
+            "points": self.build_points(
+                collection_name, collection_meta, id,
+                [texts[idx - start_index] for idx in written],
+                [vectors_by_index[idx] for idx in written],
+                payloads=[payloads[idx - start_index] for idx in written],
+                indices=written
+            ) if written else [],
+            "unchanged": unchanged,
+            "moved": len(written) - len(changed),
+            "changed": len(changed)
+        }
+
+    def find_orphan_ids(self, collection_name: str, id: int, existing: Dict[str, List[tuple]], chunk_count: int) -> List[Union[int, str]]:
+        """新片段都寫在各自的目標 ID，其餘舊點 (超出片段數、位移前的位置、舊 ID 格式) 皆為孤立點"""
+        target_ids = {self.generate_point_id(collection_name, id, idx) for idx in range(chunk_count)}
+        return [
+            point_id for entries in existing.values() for point_id, _ in entries
+            if point_id not in target_ids
+        ]
+
+    async def delete_points(self, collection_name: str, point_ids: List[Union[int, str]]):
+        if point_ids:
+            await qdrant_client.client.delete(
+                collection_name=collection_name,
+                points_selector=qdrant_models.PointIdsList(points=point_ids)
+            )
+
+    async def encode_texts(self, texts: List[str]) -> List[List[float]]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            self.thread_pool,
+            lambda: embedding.model.encode(texts).tolist()
+        )
+     
+    @staticmethod
+    def generate_point_id(collection_name: str, id: int, point_index: int) -> str:
+        """由 (集合, 文章 id, 片段序號) 決定的 UUIDv5，不同文章之間不會碰撞"""
+        return str(uuid.uuid5(POINT_ID_NAMESPACE, f"{collection_name}:{id}:{point_index}"))
            
     async def upsert_texts(self, request: UpsertCollectionRequest) -> ResultDTO:
-        if not await qdrant_client.client.collection_exists(request.collection_name):
-            print(f"集合不存在: {request.collection_name}")
-            return ResultDTO.fail(code=404, message="Collection not found")
+        if error := await self.check_collection_exists(request.collection_name):
+            return error
+        
+        return await self.upsert_chunks(
+            request.collection_name,
+            request.id,
+            [p.text for p in request.points]
+        )
+
+    async def ingest_article(self, request: IngestArticleRequest) -> ResultDTO:
+        if error := await self.check_collection_exists(request.collection_name):
+            return error
+        
+        loop = asyncio.get_running_loop()
+        chunks = await loop.run_in_executor(
+            self.thread_pool,
+            lambda: self.text_chunk_helper.chunk(request.text, request.chunk_size, request.chunk_overlap)
+        )
+        print(f"文章 {request.id} 切分為 {len(chunks)} 個片段")
+        
+        return await self.upsert_chunks(
+            request.collection_name,
+            request.id,
+            [chunk["text"] for chunk in chunks],
+            payloads=[
+                {"start_offset": chunk["start_offset"], "end_offset": chunk["end_offset"]}
+                for chunk in chunks
+            ]
+        )
+
+    async def upsert_chunks(
+        self,
+        collection_name: str,
+        id: int,
+        texts: List[str],
+        payloads: Optional[List[dict]] = None
+    ) -> ResultDTO:
+        if not texts:
+            # 空內容會讓所有既有片段成為孤立點，視為錯誤而非清空文章
+            return ResultDTO.fail(code=400, message="No chunks to upsert")
         
         try:
-            base_id = self.generate_base_id(request.id)
-            point_ids = [base_id + idx for idx in range(len(request.points))]
-            texts = [p.text for p in request.points]
+            collection_meta = await self.collection_registry.get(collection_name)
+            payloads = payloads or [{} for _ in texts]
+            existing = await self.get_existing_chunk_hashes(collection_name, id)
             
-            loop = asyncio.get_running_loop()
-            print("產生嵌入向量...")
-            vectors = await loop.run_in_executor(
-                self.thread_pool,
-                lambda: embedding.model.encode(texts).tolist()
-            )
+            try:
+                prepared = await self.prepare_chunk_points(collection_name, collection_meta, id, texts, existing, payloads=payloads)
+            except ValueError as e:
+                return ResultDTO.fail(code=400, message=str(e))
+            orphan_ids = self.find_orphan_ids(collection_name, id, existing, len(texts))
+            print(f"文章 {id}: 變更 {prepared['changed']} 個, 位移 {prepared['moved']} 個, 未變更 {len(prepared['unchanged'])} 個, 孤立 {len(orphan_ids)} 個")
             
-            if vectors and len(vectors[0]) != self.VECTOR_DIM:
-                actual_dim = len(vectors[0])
-                print(f"向量維度錯誤! 實際={actual_dim}, 預期={self.VECTOR_DIM}")
-                return ResultDTO.fail(
-                    code=400,
-                    message=f"Vector dimension mismatch"
+            if prepared["points"]:
+                await qdrant_client.client.upsert(
+                    collection_name=collection_name,
+                    points=prepared["points"]
                 )
             
-            points = [
-                PointStruct(
-                    id=point_id,
-                    vector=vector,
-                    payload={
-                        "text": p.text,
-                        "id": request.id,
-                        "point_index": idx
-                    }
+            # 未變更片段只更新附加欄位 (例如位移)，不重新嵌入
+            set_payload_operations = [
+                qdrant_models.SetPayloadOperation(
+                    set_payload=qdrant_models.SetPayload(
+                        payload=payloads[idx],
+                        points=[self.generate_point_id(collection_name, id, idx)]
+                    )
                 )
-                for idx, (p, vector, point_id) in enumerate(zip(request.points, vectors, point_ids))
+                for idx in prepared["unchanged"] if payloads[idx]
             ]
-
-            await qdrant_client.client.upsert(
-                collection_name=request.collection_name,
-                points=points
-            )
+            if set_payload_operations:
+                await qdrant_client.client.batch_update_points(
+                    collection_name=collection_name,
+                    update_operations=set_payload_operations
+                )
+            
+            await self.delete_points(collection_name, orphan_ids)
             
-            print(f"已插入 {len(points)} 個點")
-            return ResultDTO.ok(message=f"Inserted {len(points)} points")
+            print(f"已插入 {prepared['changed']} 個點")
+            return ResultDTO.ok(
+                message=f"Inserted {prepared['changed']} points, moved {prepared['moved']} without re-embedding, skipped {len(prepared['unchanged'])} unchanged, deleted {len(orphan_ids)} orphans"
+            )
             
         except Exception as e:
+            if error := self.handle_collection_not_found(collection_name, e):
+                return error
             print(f"更新失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=f"Upsert failed: {str(e)}")
+
+    async def migrate_point_ids(self, request: MigratePointIdsRequest) -> ResultDTO[dict]:
+        """將舊的 base_id + idx 整數 ID 線上改寫為 UUIDv5，讀取路徑以 id payload 過濾不受影響"""
+        if error := await self.check_collection_exists(request.collection_name):
+            return error
+        
+        migrated = 0
+        skipped = 0
+        next_offset = None
+        try:
+            while True:
+                records, next_offset = await qdrant_client.client.scroll(
+                    collection_name=request.collection_name,
+                    limit=request.batch_size,
+                    offset=next_offset,
+                    with_payload=True,
+                    with_vectors=True
+                )
+                
+                points = []
+                old_ids = []
+                for record in records:
+                    article_id = record.payload.get("id")
+                    point_index = record.payload.get("point_index")
+                    if article_id is None or point_index is None:
+                        skipped += 1
+                        continue
+                    
+                    new_id = self.generate_point_id(request.collection_name, article_id, point_index)
+                    if str(record.id) == new_id:
+                        continue
+                    
+                    points.append(PointStruct(id=new_id, vector=record.vector, payload=record.payload))
+                    old_ids.append(record.id)
+                
+                if points:
+                    await qdrant_client.client.upsert(
+                        collection_name=request.collection_name,
+                        points=points
+                    )
+                    await qdrant_client.client.delete(
+                        collection_name=request.collection_name,
+                        points_selector=qdrant_models.PointIdsList(points=old_ids)
+                    )
+                    migrated += len(points)
+                    print(f"集合 {request.collection_name} 已遷移 {migrated} 個點")
+                
+                if next_offset is None:
+                    break
+            
+            return ResultDTO.ok(
+                message=f"Migrated {migrated} points",
+                data={"migrated": migrated, "skipped": skipped}
+            )
+        except Exception as e:
+            if error := self.handle_collection_not_found(request.collection_name, e):
+                return error
+            print(f"點 ID 遷移失敗: {str(e)}")
+            return ResultDTO.fail(
+                code=500,
+                message=f"Point id migration failed: {str(e)}",
+                data={"migrated": migrated, "skipped": skipped}
+            )
+
+    def bulk_upsert_texts(self, collection_name: str, id: int, body: AsyncIterator[bytes]) -> AsyncIterator[str]:
+        return self.bulk_upsert_helper.run(collection_name, id, body)
             
     async def generate_collection(self, request: GenerateCollectionRequest) -> ResultDTO:
         try:
-            if await qdrant_client.client.collection_exists(request.collection_name):
-                collection_info = await qdrant_client.client.get_collection(request.collection_name)
-                existing_dim = collection_info.config.params.vectors.size
+            self.collection_registry.invalidate(request.collection_name)
+            if collection_meta := await self.collection_registry.refresh(request.collection_name):
+                existing_dim = collection_meta["vector_size"]
                 
                 if existing_dim != self.VECTOR_DIM:
                     print(f"維度不匹配! 現有維度={existing_dim}, 需要={self.VECTOR_DIM}")
@@ -184,18 +571,115 @@ class VectorService:
             vector_size = self.VECTOR_DIM
             distance = "COSINE"
             
+            hnsw_config = None
+            if request.hnsw_m or request.hnsw_ef_construct:
+                hnsw_config = HnswConfigDiff(
+                    m=request.hnsw_m,
+                    ef_construct=request.hnsw_ef_construct
+                )
+            
             await qdrant_client.client.create_collection(
                 collection_name=request.collection_name,
                 vectors_config=VectorParams(
                     size=vector_size,
-                    distance=Distance[distance]
-                )
+                    distance=Distance[distance],
+                    on_disk=request.on_disk
+                ),
+                sparse_vectors_config={
+                    Bm25Helper.VECTOR_NAME: SparseVectorParams(modifier=Modifier.IDF)
+                },
+                hnsw_config=hnsw_config,
+                quantization_config=self.build_quantization_config(request.quantization)
+            )
+            self.collection_registry.register(
+                request.collection_name,
+                vector_size=vector_size,
+                distance=Distance[distance],
+                sparse_vectors=[Bm25Helper.VECTOR_NAME]
             )
+            await self.ensure_payload_indexes(request.collection_name)
             print(f"集合 {request.collection_name} 建立成功")
             return ResultDTO.ok(message=f"Collection created")
         except Exception as e:
             print(f"集合建立失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=str(e))
+
+    def build_quantization_config(self, quantization: str):
+        if quantization == "scalar":
+            return ScalarQuantization(
+                scalar=ScalarQuantizationConfig(
+                    type=ScalarType.INT8,
+                    quantile=0.99,
+                    always_ram=True
+                )
+            )
+        if quantization == "binary":
+            return BinaryQuantization(
+                binary=BinaryQuantizationConfig(always_ram=True)
+            )
+        return None
+
+    def build_search_params(self) -> SearchParams:
+        return SearchParams(
+            hnsw_ef=self.SEARCH_HNSW_EF,
+            quantization=QuantizationSearchParams(
+                rescore=True,
+                oversampling=self.QUANTIZATION_OVERSAMPLING
+            )
+        )
+
+    def build_text_index_params(self) -> TextIndexParams:
+        return TextIndexParams(
+            type=TextIndexType.TEXT,
+            tokenizer=TokenizerType(self.TEXT_TOKENIZER.lower()),
+            lowercase=True
+        )
+
+    async def ensure_payload_indexes(self, collection_name: str) -> List[str]:
+        collection_info = await qdrant_client.client.get_collection(collection_name)
+        existing_schema = collection_info.payload_schema or {}
+        created = []
+        
+        if "id" not in existing_schema:
+            await qdrant_client.client.create_payload_index(
+                collection_name=collection_name,
+                field_name="id",
+                field_schema=PayloadSchemaType.INTEGER,
+                wait=True
+            )
+            created.append("id")
+        
+        if "text" not in existing_schema:
+            await qdrant_client.client.create_payload_index(
+                collection_name=collection_name,
+                field_name="text",
+                field_schema=self.build_text_index_params(),
+                wait=True
+            )
+            created.append("text")
+        
+        if created:
+            self.collection_registry.invalidate(collection_name)
+        print(f"集合 {collection_name} 新建索引: {created or '無'}")
+        return created
+
+    async def backfill_payload_indexes(self, request: EnsurePayloadIndexRequest) -> ResultDTO[Dict[str, List[str]]]:
+        try:
+            if request.collection_name:
+                if error := await self.check_collection_exists(request.collection_name):
+                    return error
+                collection_names = [request.collection_name]
+            else:
+                response = await qdrant_client.client.get_collections()
+                collection_names = [col.name for col in response.collections]
+            
+            results = {}
+            for collection_name in collection_names:
+                results[collection_name] = await self.ensure_payload_indexes(collection_name)
+            return ResultDTO.ok(data=results)
+        except Exception as e:
+            print(f"索引回填失敗: {str(e)}")
+            return ResultDTO.fail(code=500, message=str(e))
         
     def expand_query(self, query: str) -> str:
         synonym_map: Dict[str, List[str]] = {
@@ -211,12 +695,18 @@ class VectorService:
         return " ".join(list(set(expanded_terms)))
 
     async def check_collection_exists(self, collection_name: str) -> Optional[ResultDTO]:
-        exists = await qdrant_client.client.collection_exists(collection_name)
-        if not exists:
+        if not await self.collection_registry.get(collection_name):
             print(f"集合不存在: {collection_name}")
             return ResultDTO.fail(code=404, message="Collection not found")
         return None
 
+    def handle_collection_not_found(self, collection_name: str, error: Exception) -> Optional[ResultDTO]:
+        if not is_not_found_error(error):
+            return None
+        self.collection_registry.invalidate(collection_name)
+        print(f"集合已不存在，清除快取: {collection_name}")
+        return ResultDTO.fail(code=404, message="Collection not found")
+
     def build_search_filter(self, id: int) -> Filter:
         print(f"[DEBUG] 構建過濾條件，ID={id}")
         
@@ -231,7 +721,7 @@ class VectorService:
         print(f"[DEBUG] 過濾條件對象: {filter_obj}")
         return filter_obj
     
-    def format_result_text(self, point_id: int, original_text: str, max_length: int = 300) -> str:
+    def format_result_text(self, point_id: Union[int, str], original_text: str, max_length: int = 300) -> str:
         prefix = f"[相關資料 {point_id}] "
         available_length = max_length - len(prefix)
         result = f"{prefix}{original_text[:available_length]}" 
@@ -260,12 +750,10 @@ class VectorService:
         return embedding.model.encode([text]).tolist()[0]
     
     async def enhance_encoding(self, text: str) -> List[float]:
-        loop = asyncio.get_running_loop()
-        vector = await loop.run_in_executor(
-            self.thread_pool,
-            self.encode_text,  
-            text
-        )
+        if (cached := self.embedding_cache.get(text)) is not None:
+            return cached
+        
+        vector = await self.embedding_batcher.encode(text)
         
         if len(vector) != self.VECTOR_DIM:
             actual_dim = len(vector)
@@ -275,6 +763,7 @@ class VectorService:
                 vector = vector + [0.0] * (self.VECTOR_DIM - actual_dim)
             print(f"已調整查詢向量維度至 {self.VECTOR_DIM}")
         
+        self.embedding_cache.put(text, vector)
         return vector
 
     async def scroll_all_records(self, collection_name: str, search_filter: Filter) -> List:
@@ -298,6 +787,8 @@ class VectorService:
             if next_offset is None:
                 break
         
+        # UUID 點 ID 的 scroll 順序與片段順序無關，依 point_index 還原文章順序
+        all_records.sort(key=lambda record: (record.payload.get("point_index") is None, record.payload.get("point_index") or 0))
         return all_records
 
     async def vector_semantic_search(self, collection_name: str, query_text: str, id: int) -> ResultDTO[List[VectorSearchResult]]:
@@ -329,6 +820,7 @@ class VectorService:
                 collection_name=collection_name,
                 query_vector=query_vector,
                 query_filter=search_filter,
+                search_params=self.build_search_params(),
                 limit=self.HARDCODE_LIMIT * 2,
                 score_threshold=self.HARDCODE_MIN_SCORE
             )
@@ -347,6 +839,8 @@ class VectorService:
             return ResultDTO.ok(data=final_results)
         
         except Exception as e:
+            if error := self.handle_collection_not_found(collection_name, e):
+                return error
             print(f"語義搜尋失敗: {str(e)}")
             return ResultDTO.fail(code=500, message=str(e))
 
@@ -369,6 +863,8 @@ class VectorService:
             return ResultDTO.ok(data=results)
         
         except Exception as e:
+            if error := self.handle_collection_not_found(collection_name, e):
+                return error
             print(f"文章文本查詢失敗: {str(e)}")
             return ResultDTO.fail(code=500, message="Internal server error")
         
@@ -0,0 +1,50 @@
+import asyncio
+import numpy as np
+from core.embedding_init.server import EmbeddingServer, EmbeddingServerClient
+
+class FakeModel:
+    def encode(self, texts, **kwargs):
+        if "bad" in texts:
+            raise ValueError("bad input")
+        return np.array([[float(len(text)), 1.0] for text in texts], dtype="float32")
+
+async def _with_server(tmp_path, handler):
+    server = EmbeddingServer(FakeModel(), socket_path=str(tmp_path / "embedding.sock"), max_wait_ms=50)
+    task = asyncio.create_task(server.serve())
+    while not (tmp_path / "embedding.sock").exists():
+        await asyncio.sleep(0.01)
+    try:
+        return await handler(server.socket_path)
+    finally:
+        task.cancel()
+
+def test_empty_encode_returns_empty_result(tmp_path):
+    async def handler(socket_path):
+        client = EmbeddingServerClient(socket_path)
+        empty = await asyncio.to_thread(client.encode, [])
+
+        sock = client._connect()
+        try:
+            client._local.sock = sock
+            from_server = await asyncio.to_thread(client._request, [])
+        finally:
+            client._reset_socket()
+        return empty, from_server
+
+    empty, from_server = asyncio.run(_with_server(tmp_path, handler))
+    assert len(empty) == 0
+    assert len(from_server) == 0
+
+def test_failed_merged_batch_only_fails_bad_request(tmp_path):
+    async def handler(socket_path):
+        good_client = EmbeddingServerClient(socket_path)
+        bad_client = EmbeddingServerClient(socket_path)
+        return await asyncio.gather(
+            asyncio.to_thread(good_client.encode, ["abc", "de"]),
+            asyncio.to_thread(bad_client.encode, ["bad"]),
+            return_exceptions=True
+        )
+
+    good, bad = asyncio.run(_with_server(tmp_path, handler))
+    assert isinstance(bad, RuntimeError)
+    assert good[:, 0].tolist() == [3.0, 2.0]
@@ -0,0 +1,18 @@
+from helper.textChunkHelper import TextChunkHelper
+from helper.tokenCounterHelper import TokenCounterHelper
+
+def test_oversized_unit_is_split_within_chunk_size():
+    token_counter = TokenCounterHelper("unused")
+    helper = TextChunkHelper(token_counter, chunk_size=50, chunk_overlap=0)
+    url = "https://example.com/" + "/".join(f"segment{index}-a1b2_c3d4.png" for index in range(150))
+    assert len(url) > 3000
+    text = f"參考連結：{url} 請見上方。"
+
+    chunks = helper.chunk(text)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert chunk["token_count"] <= 50
+        assert token_counter.count(chunk["text"]) <= 50
+        assert text[chunk["start_offset"]:chunk["end_offset"]] == chunk["text"]
+    assert url in "".join(chunk["text"] for chunk in chunks)
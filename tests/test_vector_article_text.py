@@ -0,0 +1,36 @@
+import asyncio
+from types import SimpleNamespace
+
+from core.qdrant_client_init import qdrant_client
+from services.vectorService import VectorService
+
+class FakeScrollClient:
+    """以兩頁、UUID 順序 (非片段順序) 回傳文章片段"""
+
+    def __init__(self, records):
+        self.pages = [records[:2], records[2:]]
+
+    async def scroll(self, collection_name, scroll_filter, limit, offset, with_payload):
+        page = offset or 0
+        next_offset = page + 1 if page + 1 < len(self.pages) else None
+        return self.pages[page], next_offset
+
+def make_record(point_index: int, text: str):
+    point_id = VectorService.generate_point_id("articles", 7, point_index)
+    return SimpleNamespace(id=point_id, payload={"id": 7, "point_index": point_index, "text": text})
+
+def test_article_text_is_returned_in_chunk_order(monkeypatch):
+    texts = ["第一段", "第二段", "第三段", "第四段"]
+    records = sorted((make_record(idx, text) for idx, text in enumerate(texts)), key=lambda record: record.id)
+    assert [record.payload["point_index"] for record in records] != list(range(len(texts)))
+    monkeypatch.setattr(qdrant_client, "client", FakeScrollClient(records))
+
+    service = VectorService()
+    async def collection_exists(collection_name):
+        return None
+    monkeypatch.setattr(service, "check_collection_exists", collection_exists)
+
+    result = asyncio.run(service.vector_article_all_text_query("articles", 7))
+
+    assert result.code == 200
+    assert [next(text for text in texts if text in item.text) for item in result.data] == texts